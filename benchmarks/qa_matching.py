@@ -0,0 +1,199 @@
+"""LLM calls spent matching answers to questions while building threads: pairwise prompts versus AnswerMatcher.
+
+Usage:
+    python benchmarks/qa_matching.py --threads 200
+    python benchmarks/qa_matching.py --source db   # threads of the ingested sample corpus (run --ingest first)
+
+Both modes answer with an offline stand-in for the LLM, so only the number of requests is measured.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import zlib
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from core.models.email import Email
+from core.processors.thread_analyzer import ThreadAnalyzer
+
+WORDS = re.compile(r"[a-z0-9]+")
+
+
+def words(text: str):
+    return set(WORDS.findall(text.lower()))
+
+
+def related(question: str, reference: str) -> bool:
+    """The offline stand-in for the LLM's judgement"""
+    return len(words(question) & words(reference)) >= 0.5 * max(len(words(question)), 1)
+
+
+class OfflineLLM:
+    """Hashed bag-of-words embeddings; questions and answers "match" when they share most of their words"""
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+        self.prompts = 0
+        self.embedding_requests = 0
+
+    def generate(self, prompt, system_prompt=None, temperature=0.7):
+        self.prompts += 1
+        pairs = re.findall(r"Question: (.*)\n\s*Answer reference: (.*)", prompt)
+        decisions = [related(q, a) for q, a in pairs]
+        if prompt.startswith("For each numbered pair"):
+            return json.dumps(decisions)
+        return "YES" if decisions and decisions[0] else "NO"
+
+    def generate_embeddings(self, texts):
+        self.embedding_requests += 1
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in words(text):
+                vectors[row, zlib.crc32(word.encode()) % self.dimensions] += 1.0
+        return vectors.tolist()
+
+
+def make_threads(count: int, seed: int = 0):
+    """Threads whose later emails answer earlier questions verbatim, reworded, partially or not at all"""
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"term{i}" for i in range(400)]
+    start = datetime(2024, 1, 1)
+    threads = []
+    for t in range(count):
+        emails, open_questions = [], []
+        for e in range(int(rng.integers(3, 9))):
+            questions = []
+            for _ in range(int(rng.integers(0, 3))):
+                text = " ".join(rng.choice(vocabulary, 6, replace=False)) + "?"
+                questions.append({'question': text, 'needs_answer': True})
+            answers = []
+            for question in open_questions[:int(rng.integers(0, 3))]:
+                kind = rng.random()
+                terms = question.rstrip('?').split()
+                if kind < 0.25:
+                    reference = question
+                elif kind < 0.6:
+                    reference = " ".join(rng.permutation(terms)) + " confirmed"
+                elif kind < 0.8:
+                    reference = " ".join(terms[:3] + list(rng.choice(vocabulary, 3, replace=False)))
+                else:
+                    reference = " ".join(rng.choice(vocabulary, 6, replace=False))
+                answers.append({'answers_question': reference, 'answer': 'See above'})
+            open_questions = [q['question'] for q in questions] + open_questions
+            emails.append(Email(
+                id=f"{t}-{e}",
+                subject=f"{'Re: ' if e else ''}Thread {t}",
+                date=start + timedelta(days=t, hours=e * 7),
+                from_email=f"person{e % 3}@example.com",
+                from_name='',
+                to_emails=['owner@example.com'],
+                cc_emails=[],
+                body='',
+                attachments=[],
+                thread_id=None,
+                is_internal=True,
+                embedding=None,
+                metadata={'questions_asked': questions, 'answers_provided': answers}
+            ))
+        threads.append(emails)
+    return threads
+
+
+def load_threads_from_db():
+    """Ingested emails grouped by thread (or by source file before --analyze has run)"""
+    from core.implementations.mongo_storage import MongoStorage
+    from core.services.analysis_service import AnalysisService
+    storage = MongoStorage()
+    storage.connect()
+    try:
+        threads = {}
+        for email in AnalysisService(storage, OfflineLLM(), None, None)._load_emails({}, quiet=True):
+            threads.setdefault(email.thread_id or email.source_file, []).append(email)
+        return list(threads.values())
+    finally:
+        storage.disconnect()
+
+
+def pairwise_prompts(emails):
+    """Requests the previous per-pair matching sent for one thread: one prompt for every pair the loops reached"""
+    sorted_emails = sorted(emails, key=lambda e: e.date)
+
+    def quick(question, reference):
+        return question.lower() in reference.lower() or reference.lower() in question.lower()
+
+    def matches(question, reference):
+        return bool(question and reference) and (quick(question, reference) or related(question, reference))
+
+    prompts = 0
+    # Response chains: every open question against every answer, no substring shortcut
+    tracked = []
+    for email in sorted_emails:
+        tracked.extend([q['question'], False] for q in email.metadata.get('questions_asked', []) if q.get('needs_answer'))
+        for answer in email.metadata.get('answers_provided', []):
+            reference = answer.get('answers_question', '')
+            for entry in tracked:
+                if not entry[1] and entry[0] and reference:
+                    prompts += 1
+                    entry[1] = matches(entry[0], reference)
+
+    # Daily status: same-day answers first, then any later day, stopping at the first match
+    def counted(question, reference):
+        nonlocal prompts
+        if question and reference and not quick(question, reference):
+            prompts += 1
+        return matches(question, reference)
+
+    by_day = {}
+    for email in sorted_emails:
+        by_day.setdefault(email.date.date(), []).append(email)
+    for day, day_emails in by_day.items():
+        for asking in day_emails:
+            for q in asking.metadata.get('questions_asked', []):
+                if not q.get('needs_answer'):
+                    continue
+                answered = False
+                for email in day_emails:
+                    if email.date > asking.date:
+                        for answer in email.metadata.get('answers_provided', []):
+                            if counted(q['question'], answer.get('answers_question', '')):
+                                answered = True
+                                break
+                    if answered:
+                        break
+                if not answered:
+                    any(counted(q['question'], answer.get('answers_question', ''))
+                        for later_day, later_emails in by_day.items() if later_day > day
+                        for email in later_emails for answer in email.metadata.get('answers_provided', []))
+    return prompts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', choices=['synthetic', 'db'], default='synthetic')
+    parser.add_argument('--threads', type=int, default=200, help="synthetic threads to generate")
+    args = parser.parse_args()
+
+    threads = make_threads(args.threads) if args.source == 'synthetic' else load_threads_from_db()
+    before = sum(pairwise_prompts(emails) for emails in threads)
+
+    analyzer = ThreadAnalyzer(OfflineLLM(), None)
+    for emails in threads:
+        answer_index = analyzer.response_tracker.build_answer_index(emails)
+        analyzer.response_tracker.analyze_response_chains(emails, answer_index)
+        analyzer._analyze_daily_responses_enhanced(emails, answer_index)
+    stats = analyzer.answer_matcher.stats
+
+    print(f"threads: {len(threads)}, emails: {sum(len(emails) for emails in threads)}")
+    print(f"pairwise LLM prompts (before): {before}")
+    print(f"matcher LLM prompts (after):   {stats['llm_calls']} "
+          f"+ {stats['embedding_calls']} embedding requests")
+    print(f"pairs decided: {stats['pairs']} ({stats['accepted']} accepted, {stats['rejected']} rejected, "
+          f"{stats['borderline']} borderline sent to the LLM)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Thread pairs scored by cross-thread connection detection: all pairs versus candidate generation.
+
+Usage: python benchmarks/thread_candidates.py --sizes 250 500 1000 2000 4000 --recall-max 1000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from core.models.email import Email
+from core.processors.thread_analyzer import ThreadAnalyzer
+
+
+class OfflineLLM:
+    """Answers NO to every verification prompt so only the deterministic signals count"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, prompt, system_prompt=None, temperature=0.7):
+        self.calls += 1
+        return "NO"
+
+
+def make_thread_groups(size: int, dimensions: int, seed: int = 0):
+    """Synthetic thread groups; a topic spans a few threads that share people, terms and subjects"""
+    rng = np.random.default_rng(seed)
+    topics = max(1, size // 4)
+    centers = rng.standard_normal((topics, dimensions)).astype(np.float32)
+    people = [f"person{i}@example.com" for i in range(max(20, size // 2))]
+    start = datetime(2024, 1, 1)
+
+    groups = []
+    first_thread = {}
+    for t in range(size):
+        topic = int(rng.integers(topics))
+        first = first_thread.setdefault(topic, t)
+        team = [people[(topic * 7 + offset) % len(people)] for offset in range(3)]
+        emails = []
+        for e in range(int(rng.integers(1, 5))):
+            vector = centers[topic] + 0.2 * rng.standard_normal(dimensions).astype(np.float32)
+            emails.append(Email(
+                id=f"{t}-{e}",
+                subject=f"{'Re: ' if e else ''}Project Topic{topic} item {t}",
+                date=start + timedelta(hours=t * 5 + e),
+                from_email=team[e % len(team)],
+                from_name='',
+                to_emails=['owner@example.com', team[(e + 1) % len(team)]],
+                cc_emails=[],
+                body=f"Following up on Project Topic{topic} item {first}, ticket PRJ-{topic}. Details for item {t}.",
+                attachments=[],
+                thread_id=None,
+                is_internal=True,
+                embedding=vector.tolist(),
+                metadata={}
+            ))
+        groups.append(emails)
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[250, 500, 1000, 2000, 4000])
+    parser.add_argument('--dimensions', type=int, default=256)
+    parser.add_argument('--recall-max', type=int, default=1000,
+                        help="also score every pair (slow) for corpora up to this many threads")
+    args = parser.parse_args()
+
+    print(f"{'threads':>8} {'all pairs':>12} {'candidates':>11} {'ratio':>7} {'candidate s':>12} {'recall':>7}")
+    for size in args.sizes:
+        groups = make_thread_groups(size, args.dimensions)
+        analyzer = ThreadAnalyzer(OfflineLLM(), None)
+        summaries = [analyzer._create_thread_summary(group) for group in groups]
+
+        started = time.perf_counter()
+        centroids, has_embedding = analyzer._normalized_centroids(summaries)
+        candidates = analyzer._candidate_pairs(groups, summaries, centroids, has_embedding)
+        elapsed = time.perf_counter() - started
+
+        all_pairs = size * (size - 1) // 2
+        recall = ''
+        if size <= args.recall_max:
+            connected = set()
+            for i in range(size):
+                for j in range(i + 1, size):
+                    similarity = float(centroids[i] @ centroids[j])
+                    result = analyzer._calculate_thread_connection_score(
+                        groups[i], groups[j], summaries[i], summaries[j], similarity)
+                    if result['score'] > 0.7:
+                        connected.add((i, j))
+            recall = f"{len(connected & candidates) / len(connected):.3f}" if connected else 'n/a'
+
+        print(f"{size:>8} {all_pairs:>12} {len(candidates):>11} {len(candidates) / max(all_pairs, 1):>7.2%} "
+              f"{elapsed:>12.3f} {recall:>7}")
+
+
+if __name__ == '__main__':
+    main()
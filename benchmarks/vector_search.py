@@ -0,0 +1,73 @@
+"""Recall@k and latency of the IVF vector index against exact search.
+
+Usage: python benchmarks/vector_search.py --size 200000 --dimensions 1536
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from core.implementations.vector_index import FlatIndex, IVFIndex
+
+
+def make_corpus(size: int, dimensions: int, topics: int, seed: int = 0):
+    """Clustered synthetic embeddings, roughly how email topics spread in embedding space"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dimensions)).astype(np.float32)
+    labels = rng.integers(0, topics, size)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((size, dimensions)).astype(np.float32)
+    return [f"doc-{i}" for i in range(size)], vectors
+
+
+def timed_search(index, queries, k):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([doc_id for doc_id, _ in index.search(query, k)])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--dimensions', type=int, default=1536)
+    parser.add_argument('--topics', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32])
+    args = parser.parse_args()
+
+    ids, vectors = make_corpus(args.size, args.dimensions, args.topics)
+    queries = make_corpus(args.queries, args.dimensions, args.topics, seed=1)[1]
+
+    flat = FlatIndex()
+    flat.add(ids, vectors)
+    exact, flat_latency = timed_search(flat, queries, args.k)
+    print(f"corpus={args.size} dims={args.dimensions} k={args.k}")
+    print(f"exact   p50={np.percentile(flat_latency, 50):7.2f}ms p95={np.percentile(flat_latency, 95):7.2f}ms")
+
+    start = time.perf_counter()
+    flat.search_batch(queries, args.k)
+    batch_ms = (time.perf_counter() - start) * 1000
+    print(f"exact batch of {len(queries)}: {batch_ms:.1f}ms total, {batch_ms / len(queries):.2f}ms/query")
+
+    start = time.perf_counter()
+    ivf = IVFIndex()
+    ivf.train(vectors)
+    ivf.add(ids, vectors)
+    print(f"ivf build {time.perf_counter() - start:.1f}s")
+
+    for n_probe in args.nprobe:
+        ivf.n_probe = n_probe
+        approx, ivf_latency = timed_search(ivf, queries, args.k)
+        recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approx, exact) if e])
+        print(f"ivf nprobe={n_probe:<3} recall@{args.k}={recall:.3f} "
+              f"p50={np.percentile(ivf_latency, 50):7.2f}ms p95={np.percentile(ivf_latency, 95):7.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -15,22 +15,74 @@ ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 MONGO_CONNECTION_STRING = os.getenv("MONGO_CONNECTION_STRING")
 
 DATABASE_NAME = "portfolio_health"
+MONGO_MAX_POOL_SIZE = 50  # Connections shared by all web requests and worker threads
+MONGO_MIN_POOL_SIZE = 5
+MONGO_MAX_IDLE_TIME_MS = 5 * 60 * 1000
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 5000
 EMAILS_COLLECTION = "emails"
 THREADS_COLLECTION = "threads"
 PRIORITIES_COLLECTION = "priorities"
+PENDING_QUESTIONS_COLLECTION = "pending_questions"
+DATASET_METADATA_COLLECTION = "dataset_metadata"
 COLLEAGUES_COLLECTION = "colleagues"
+MANIFEST_COLLECTION = "ingestion_manifest"
 
 RESPONSE_TRACKING_ENABLED = True
 MAX_DAYS_WITHOUT_RESPONSE = 3
 CRITICAL_DAYS_WITHOUT_RESPONSE = 7
 
 EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 1536
+EMBEDDING_BATCH_MAX_TOKENS = 250000  # The embeddings endpoint caps a request at 300k tokens
+EMBEDDING_BATCH_MAX_INPUTS = 2048
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_PATH = DATA_DIR / "cache" / "embeddings.sqlite3"
+API_CACHE_ENTRIES = 512  # Serialized read-endpoint responses kept per dataset version
+QUERY_CACHE_ENABLED = True  # Reuse embeddings of repeated /api/search queries
+QUERY_CACHE_MEMORY_ENTRIES = 1024
+QUERY_CACHE_PATH = DATA_DIR / "cache" / "query_embeddings.sqlite3"  # None keeps the cache in memory only
+QUERY_CACHE_MAX_ENTRIES = 50000
 LLM_MODEL = "gpt-4.1-mini"
 VALIDATOR_MODEL = "claude-3-5-sonnet-20240620"
 
+STORAGE_BULK_FLUSH_SIZE = 1000  # Buffered writes sent per unordered bulk_write
+STORAGE_FIND_BATCH_SIZE = 500  # Documents per cursor batch when streaming a find
+
+INGESTION_CONCURRENCY = 8  # Concurrent LLM parse and embedding requests
+INGESTION_QUEUE_SIZE = 16  # Files buffered between pipeline stages
+INGESTION_WRITE_BATCH_SIZE = 100
+INGESTION_EMBEDDING_BATCH_SIZE = 500  # Emails collected across files per embedding call
+EMAIL_PARSE_CHUNK_TOKENS = 1500  # Messages of a file sent to the LLM per parse request, split at message boundaries
+EMAIL_PARSE_CONCURRENCY = 4  # Chunks of one file parsed at once
+
+VECTOR_INDEX_DIR = DATA_DIR / "vector_index"
+VECTOR_INDEX_TYPE = "ivf"  # "ivf" or "flat"
+VECTOR_INDEX_MIN_IVF_SIZE = 20000  # Exact search below this many vectors
+VECTOR_INDEX_NPROBE = 32
+VECTOR_INDEX_TRAIN_ITERATIONS = 10
+
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = DATA_DIR / "cache" / "llm_responses.sqlite3"
+LLM_CACHE_MEMORY_ENTRIES = 2048
+LLM_CACHE_MAX_ENTRIES = 200000
+LLM_CACHE_TTL_SECONDS = 30 * 24 * 3600
+
+ANALYSIS_CONCURRENCY = 8  # Threads scored in parallel during analysis
+OPENAI_REQUESTS_PER_MINUTE = 500  # Per-provider request rate limits; None disables
+ANTHROPIC_REQUESTS_PER_MINUTE = 50
+
+PRIORITY_ASSESSMENT_MODE = "separate"  # "separate" (three calls) or "fused" (one structured call per thread)
 VALIDATION_ROUNDS = 1
+VALIDATOR_CONCURRENCY = 4  # Validation requests in flight at once
+VALIDATOR_PACK_SIZE = 5  # Priority assessments validated per request; 1 sends each on its own
+VALIDATOR_MAX_RETRIES = 5  # Attempts on rate-limit/overload errors, with exponential backoff
 PRIORITY_THRESHOLD = 0.7
 THREAD_SIMILARITY_THRESHOLD = 0.85
+THREAD_CANDIDATE_NEIGHBORS = 10  # Nearest thread centroids considered for cross-thread merging
+THREAD_CANDIDATE_MAX_POSTING = 50  # Ignore participants/terms/subject words shared by more threads than this
+QA_MATCH_ACCEPT_THRESHOLD = 0.80  # Question/answer embedding similarity accepted without asking the LLM
+QA_MATCH_REJECT_THRESHOLD = 0.45  # ...and rejected below this; the band in between goes to the LLM
+QA_MATCH_LLM_BATCH_SIZE = 40  # Borderline question/answer pairs per LLM prompt
 
 ATTENTION_FLAGS = [
     "unresolved_questions",
@@ -1,29 +1,94 @@
-from anthropic import Anthropic
-from typing import Dict, Any, List
+from anthropic import Anthropic, APIStatusError, RateLimitError
+from typing import Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from core.interfaces.validator import ValidatorInterface
+from core.utils.rate_limiter import RateLimiter
 import config
 import json
+import threading
+import time
 
 class AnthropicValidator(ValidatorInterface):
     def __init__(self):
         self.client = Anthropic(api_key=config.ANTHROPIC_API_KEY)
-        
+        self.rate_limiter = RateLimiter(config.ANTHROPIC_REQUESTS_PER_MINUTE)
+        self._in_flight = threading.BoundedSemaphore(config.VALIDATOR_CONCURRENCY)
+
     def validate(self, data: Dict[str, Any], validation_prompt: str) -> Dict[str, Any]:
         prompt = f"{validation_prompt}\n\nData to validate:\n{json.dumps(data, indent=2)}"
-        
-        response = self.client.messages.create(
-            model=config.VALIDATOR_MODEL,
-            max_tokens=1000,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
+
+        response = self._create_message(prompt, max_tokens=1000)
+
         try:
             return json.loads(response.content[0].text)
         except:
             return {"valid": False, "errors": ["Invalid response format"]}
-            
-    def validate_batch(self, data_list: List[Dict[str, Any]], validation_prompt: str) -> List[Dict[str, Any]]:
-        results = []
-        for data in data_list:
-            results.append(self.validate(data, validation_prompt))
-        return results
\ No newline at end of file
+
+    def validate_batch(self, data_list: List[Dict[str, Any]], validation_prompt: str,
+                       pack_size: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Validate concurrently; with pack_size > 1, several items share one request"""
+        pack_size = pack_size or config.VALIDATOR_PACK_SIZE
+        packs = [list(range(i, min(i + pack_size, len(data_list)))) for i in range(0, len(data_list), pack_size)]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(data_list)
+
+        def run(pack: List[int]):
+            if len(pack) == 1:
+                results[pack[0]] = self._validate_safely(data_list[pack[0]], validation_prompt)
+                return
+            packed = self._validate_packed([data_list[i] for i in pack], validation_prompt)
+            for i, result in zip(pack, packed):
+                # Items the packed reply left out are validated on their own
+                results[i] = result if result is not None else self._validate_safely(data_list[i], validation_prompt)
+
+        with ThreadPoolExecutor(max_workers=config.VALIDATOR_CONCURRENCY) as pool:
+            list(pool.map(run, packs))
+        return results
+
+    def _validate_packed(self, items: List[Dict[str, Any]], validation_prompt: str) -> List[Optional[Dict[str, Any]]]:
+        prompt = f"""{validation_prompt}
+
+Validate each of the {len(items)} items below independently.
+Return a JSON array with exactly one result object per item, in the same order,
+each with an additional "index" field matching the item's index.
+
+Items to validate:
+{json.dumps([{'index': i, 'data': item} for i, item in enumerate(items)], indent=2)}"""
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        try:
+            response = self._create_message(prompt, max_tokens=min(1000 * len(items), 8000))
+            parsed = json.loads(response.content[0].text)
+        except Exception:
+            return results
+
+        if isinstance(parsed, list):
+            for position, result in enumerate(parsed):
+                if not isinstance(result, dict):
+                    continue
+                index = result.pop('index', position)
+                if isinstance(index, int) and 0 <= index < len(items):
+                    results[index] = result
+        return results
+
+    def _validate_safely(self, data: Dict[str, Any], validation_prompt: str) -> Dict[str, Any]:
+        try:
+            return self.validate(data, validation_prompt)
+        except Exception as e:
+            return {"valid": False, "errors": [str(e)]}
+
+    def _create_message(self, prompt: str, max_tokens: int):
+        """Send one request under the concurrency cap, backing off on rate-limit and overload errors"""
+        for attempt in range(config.VALIDATOR_MAX_RETRIES):
+            try:
+                with self._in_flight:
+                    self.rate_limiter.acquire()
+                    return self.client.messages.create(
+                        model=config.VALIDATOR_MODEL,
+                        max_tokens=max_tokens,
+                        messages=[{"role": "user", "content": prompt}]
+                    )
+            except (RateLimitError, APIStatusError) as e:
+                retryable = isinstance(e, RateLimitError) or getattr(e, 'status_code', None) in (429, 529)
+                if not retryable or attempt == config.VALIDATOR_MAX_RETRIES - 1:
+                    raise
+                time.sleep(2 ** attempt)
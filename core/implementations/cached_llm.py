@@ -0,0 +1,38 @@
+from typing import List, Optional
+from core.interfaces.llm import LLMInterface
+from core.utils.response_cache import ResponseCache, make_cache_key
+import config
+
+class CachedLLM(LLMInterface):
+    """Serves repeated prompts from a ResponseCache instead of the wrapped LLM"""
+    
+    def __init__(self, llm: LLMInterface, cache: ResponseCache):
+        self.llm = llm
+        self.cache = cache
+        
+    def generate(self, prompt: str, system_prompt: Optional[str] = None, temperature: float = 0.7) -> str:
+        key = make_cache_key('generate', config.LLM_MODEL, system_prompt, prompt, temperature)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+            
+        response = self.llm.generate(prompt, system_prompt, temperature)
+        if response:
+            self.cache.set(key, response)
+        return response
+        
+    def generate_embedding(self, text: str) -> List[float]:
+        return self.llm.generate_embedding(text)
+        
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self.llm.generate_embeddings(texts)
+        
+    def batch_generate(self, prompts: List[str], system_prompt: Optional[str] = None) -> List[str]:
+        results = []
+        for prompt in prompts:
+            try:
+                results.append(self.generate(prompt, system_prompt))
+            except Exception as e:
+                print(f"Error in batch generate: {str(e)}")
+                results.append("")
+        return results
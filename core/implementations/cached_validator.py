@@ -0,0 +1,49 @@
+from typing import Dict, Any, List, Optional
+from core.interfaces.validator import ValidatorInterface
+from core.utils.response_cache import ResponseCache, make_cache_key
+import config
+
+# Ids that are reassigned on every analysis run; they don't change what the validator is judging
+_RUN_SPECIFIC_FIELDS = ('thread_id',)
+
+class CachedValidator(ValidatorInterface):
+    """Serves repeated validations from a ResponseCache instead of the wrapped validator"""
+    
+    def __init__(self, validator: ValidatorInterface, cache: ResponseCache):
+        self.validator = validator
+        self.cache = cache
+        
+    def validate(self, data: Dict[str, Any], validation_prompt: str) -> Dict[str, Any]:
+        key = self._cache_key(data, validation_prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+            
+        result = self.validator.validate(data, validation_prompt)
+        if self._is_cacheable(result):
+            self.cache.set(key, result)
+        return result
+        
+    def validate_batch(self, data_list: List[Dict[str, Any]], validation_prompt: str,
+                       pack_size: Optional[int] = None) -> List[Dict[str, Any]]:
+        keys = [self._cache_key(data, validation_prompt) for data in data_list]
+        results = [self.cache.get(key) for key in keys]
+        
+        # Only the misses go to the wrapped validator, still as one batch
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            fresh = self.validator.validate_batch([data_list[i] for i in missing], validation_prompt, pack_size)
+            for i, result in zip(missing, fresh):
+                results[i] = result
+                if self._is_cacheable(result):
+                    self.cache.set(keys[i], result)
+        return results
+        
+    def _cache_key(self, data: Dict[str, Any], validation_prompt: str) -> str:
+        # Content plus validation_round: each round of a multi-round validation is cached on its own
+        content = {field: value for field, value in data.items() if field not in _RUN_SPECIFIC_FIELDS}
+        return make_cache_key('validate', config.VALIDATOR_MODEL, validation_prompt, content)
+        
+    def _is_cacheable(self, result: Dict[str, Any]) -> bool:
+        # Failed or unparseable validator replies are transient; retry them next run
+        return bool(result) and not (result.get('valid') is False and result.get('errors'))
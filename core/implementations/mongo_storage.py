@@ -1,21 +1,35 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, InsertOne, ReplaceOne, UpdateOne, UpdateMany
 from bson import ObjectId
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterator
 from core.interfaces.storage import StorageInterface
+from core.utils.bulk_writer import BulkWriter
+import weakref
 import config
 
 class MongoStorage(StorageInterface):
     def __init__(self):
         self.client = None
         self.db = None
+        self._writers = weakref.WeakSet()  # Open bulk writers, flushed on disconnect
         
     def connect(self):
-        self.client = MongoClient(config.MONGO_CONNECTION_STRING)
+        self.client = MongoClient(
+            config.MONGO_CONNECTION_STRING,
+            maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+            minPoolSize=config.MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=config.MONGO_MAX_IDLE_TIME_MS,
+            serverSelectionTimeoutMS=config.MONGO_SERVER_SELECTION_TIMEOUT_MS
+        )
         self.db = self.client[config.DATABASE_NAME]
         
     def disconnect(self):
+        # Flush-on-close: nothing buffered is lost when the connection goes away
+        for writer in self._writers:
+            writer.close()
+        self._writers = weakref.WeakSet()
         if self.client:
             self.client.close()
+            self.client = None
             
     def insert_one(self, collection: str, document: Dict[str, Any]) -> str:
         result = self.db[collection].insert_one(document)
@@ -34,10 +48,41 @@ class MongoStorage(StorageInterface):
             cursor = cursor.limit(limit)
         return list(cursor)
         
+    def find_iter(self, collection: str, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None,
+                  batch_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        cursor = self.db[collection].find(query, projection, batch_size=batch_size or config.STORAGE_FIND_BATCH_SIZE)
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+            
     def update_one(self, collection: str, query: Dict[str, Any], update: Dict[str, Any]) -> bool:
         result = self.db[collection].update_one(query, {"$set": update})
         return result.modified_count > 0
         
     def delete_one(self, collection: str, query: Dict[str, Any]) -> bool:
         result = self.db[collection].delete_one(query)
-        return result.deleted_count > 0
\ No newline at end of file
+        return result.deleted_count > 0
+        
+    def bulk_write(self, collection: str, operations: List[Dict[str, Any]]) -> Dict[str, int]:
+        requests = []
+        for operation in operations:
+            if operation['op'] == 'insert':
+                requests.append(InsertOne(operation['document']))
+            elif operation['op'] == 'replace':
+                requests.append(ReplaceOne(operation['filter'], operation['document'], upsert=operation.get('upsert', False)))
+            elif operation['op'] == 'update':
+                update_cls = UpdateMany if operation.get('many') else UpdateOne
+                requests.append(update_cls(operation['filter'], {"$set": operation['update']}, upsert=operation.get('upsert', False)))
+            else:
+                raise ValueError(f"Unknown bulk operation: {operation['op']}")
+                
+        if not requests:
+            return {'inserted': 0, 'upserted': 0, 'modified': 0}
+        result = self.db[collection].bulk_write(requests, ordered=False)
+        return {'inserted': result.inserted_count, 'upserted': result.upserted_count, 'modified': result.modified_count}
+        
+    def bulk_writer(self, collection: str, flush_size: Optional[int] = None) -> BulkWriter:
+        writer = BulkWriter(self, collection, flush_size)
+        self._writers.add(writer)
+        return writer
\ No newline at end of file
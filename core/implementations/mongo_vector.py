@@ -1,79 +1,163 @@
 from typing import List, Dict, Any, Tuple, Optional
 from core.interfaces.vector_store import VectorStoreInterface
 from core.implementations.mongo_storage import MongoStorage
+from core.implementations.vector_index import FlatIndex, build_index
 from bson import ObjectId
 import numpy as np
+import threading
+import config
 
 class MongoVectorStore(VectorStoreInterface):
     def __init__(self, storage: MongoStorage):
         self.storage = storage
-        
+        self._indexes: Dict[str, FlatIndex] = {}
+        self._index_mtimes: Dict[str, Optional[float]] = {}
+        self._dirty = set()
+        self._lock = threading.RLock()
+
     def create_index(self, collection: str, field: str, dimensions: int):
-        # Create a 2dsphere index for vector similarity search
-        self.storage.db[collection].create_index([(field, "2dsphere")])
-        self.storage.db[collection].create_index([("embedding", 1)])
-        
-    def insert_vectors(self, collection: str, documents: List[Dict[str, Any]]):
-        if documents:
-            self.storage.insert_many(collection, documents)
-        
+        """Build the in-process vector index for a collection and persist it next to the data"""
+        ids, vectors = self._load_vectors(collection, field, dimensions)
+        index = build_index(ids, vectors)
+        with self._lock:
+            self._indexes[collection] = index
+            self._save_index(collection)
+        print(f"Built {index.kind} vector index over {len(index)} documents in '{collection}'")
+
+    def insert_vectors(self, collection: str, documents: List[Dict[str, Any]]) -> List[str]:
+        """Insert documents and add their embeddings to the in-memory index; call persist_index to save it"""
+        if not documents:
+            return []
+        inserted_ids = self.storage.insert_many(collection, documents)
+        indexed = [(doc_id, doc['embedding']) for doc_id, doc in zip(inserted_ids, documents) if doc.get('embedding')]
+        if indexed:
+            with self._lock:
+                index = self._get_index(collection)
+                index.add([doc_id for doc_id, _ in indexed], np.array([vec for _, vec in indexed], dtype=np.float32))
+                self._dirty.add(collection)
+        return inserted_ids
+
+    def remove_vectors(self, collection: str, document_ids: List[str]):
+        """Drop documents from the in-memory index (the documents themselves are left alone)"""
+        if document_ids:
+            with self._lock:
+                self._get_index(collection).remove([str(doc_id) for doc_id in document_ids])
+                self._dirty.add(collection)
+
+    def persist_index(self, collection: str):
+        with self._lock:
+            if collection in self._dirty and collection in self._indexes:
+                self._save_index(collection)
+
     def search_similar(self, collection: str, query_vector: List[float], k: int = 10) -> List[Tuple[Dict[str, Any], float]]:
-        """Search for similar documents using cosine similarity"""
+        """Search for similar documents using the in-process vector index"""
         try:
-            # Get all documents with embeddings
-            pipeline = [
-                {"$match": {"embedding": {"$exists": True, "$ne": []}}},
-                {"$limit": 1000}  # Limit to prevent memory issues
-            ]
-            
-            documents = list(self.storage.db[collection].aggregate(pipeline))
-            
-            results = []
-            query_vec = np.array(query_vector)
-            
-            for doc in documents:
-                if 'embedding' in doc and doc['embedding']:
-                    try:
-                        doc_vec = np.array(doc['embedding'])
-                        if doc_vec.shape == query_vec.shape:
-                            similarity = self._cosine_similarity(query_vec, doc_vec)
-                            results.append((doc, float(similarity)))
-                    except Exception as e:
-                        continue
-                        
-            # Sort by similarity descending
-            results.sort(key=lambda x: x[1], reverse=True)
-            return results[:k]
-            
+            with self._lock:
+                hits = self._get_index(collection).search(np.asarray(query_vector, dtype=np.float32), k)
+            return self._attach_documents(collection, [hits])[0]
+
         except Exception as e:
             print(f"Error in search_similar: {str(e)}")
             return []
-        
+
+    def search_similar_batch(self, collection: str, query_vectors: List[List[float]], k: int = 10) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """Search several queries at once: one similarity matmul and one document fetch"""
+        try:
+            if not query_vectors:
+                return []
+            dimensions = max(len(vector) for vector in query_vectors)
+            queries = np.zeros((len(query_vectors), dimensions), dtype=np.float32)
+            for i, vector in enumerate(query_vectors):
+                if len(vector) == dimensions:
+                    queries[i] = vector
+
+            with self._lock:
+                hits = self._get_index(collection).search_batch(queries, k)
+            return self._attach_documents(collection, hits)
+
+        except Exception as e:
+            print(f"Error in search_similar_batch: {str(e)}")
+            return [[] for _ in query_vectors]
+
+    def invalidate_index(self, collection: str):
+        """Drop the cached index, e.g. when the collection is about to be re-ingested"""
+        with self._lock:
+            self._indexes.pop(collection, None)
+            self._index_mtimes.pop(collection, None)
+            self._dirty.discard(collection)
+            self._index_path(collection).unlink(missing_ok=True)
+
     def update_vector(self, collection: str, document_id: str, vector: List[float]):
         try:
             if isinstance(document_id, str):
                 doc_id = ObjectId(document_id)
             else:
                 doc_id = document_id
-                
+
             self.storage.update_one(
-                collection, 
-                {'_id': doc_id}, 
+                collection,
+                {'_id': doc_id},
                 {'embedding': vector}
             )
+
+            with self._lock:
+                index = self._get_index(collection)
+                if vector:
+                    index.add([str(doc_id)], np.array([vector], dtype=np.float32))
+                else:
+                    index.remove([str(doc_id)])
+                self._dirty.add(collection)
         except Exception as e:
             print(f"Error updating vector: {str(e)}")
-        
-    def _cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
-        """Calculate cosine similarity between two vectors"""
-        try:
-            dot_product = np.dot(vec1, vec2)
-            norm1 = np.linalg.norm(vec1)
-            norm2 = np.linalg.norm(vec2)
-            
-            if norm1 == 0 or norm2 == 0:
-                return 0.0
-                
-            return dot_product / (norm1 * norm2)
-        except Exception:
-            return 0.0
\ No newline at end of file
+
+    def _attach_documents(self, collection: str, hits: List[List[Tuple[str, float]]]) -> List[List[Tuple[Dict[str, Any], float]]]:
+        object_ids = list({ObjectId(doc_id) for query_hits in hits for doc_id, _ in query_hits})
+        if not object_ids:
+            return [[] for _ in hits]
+
+        documents = {str(doc['_id']): doc for doc in self.storage.db[collection].find({'_id': {'$in': object_ids}})}
+        return [[(documents[doc_id], score) for doc_id, score in query_hits if doc_id in documents] for query_hits in hits]
+
+    def _get_index(self, collection: str) -> FlatIndex:
+        """Return the in-memory index, reloading it when another process rebuilt it on disk"""
+        path = self._index_path(collection)
+        mtime = path.stat().st_mtime if path.exists() else None
+
+        fresh = mtime is None or mtime == self._index_mtimes.get(collection) or collection in self._dirty
+        if collection in self._indexes and fresh:
+            return self._indexes[collection]
+
+        if mtime is not None:
+            self._indexes[collection] = FlatIndex.load(path)
+            self._index_mtimes[collection] = mtime
+        else:
+            ids, vectors = self._load_vectors(collection, 'embedding', config.EMBEDDING_DIMENSIONS)
+            self._indexes[collection] = build_index(ids, vectors)
+            self._save_index(collection)
+
+        return self._indexes[collection]
+
+    def _save_index(self, collection: str):
+        path = self._index_path(collection)
+        self._indexes[collection].save(path)
+        self._index_mtimes[collection] = path.stat().st_mtime
+        self._dirty.discard(collection)
+
+    def _index_path(self, collection: str):
+        return config.VECTOR_INDEX_DIR / f"{collection}.npz"
+
+    def _load_vectors(self, collection: str, field: str, dimensions: int) -> Tuple[List[str], np.ndarray]:
+        ids = []
+        rows = []
+        cursor = self.storage.db[collection].find(
+            {field: {"$exists": True, "$ne": []}},
+            {field: 1}
+        )
+        for doc in cursor:
+            vector = doc.get(field)
+            if vector and len(vector) == dimensions:
+                ids.append(str(doc['_id']))
+                rows.append(np.asarray(vector, dtype=np.float32))
+
+        vectors = np.vstack(rows) if rows else np.empty((0, dimensions), dtype=np.float32)
+        return ids, vectors
@@ -1,6 +1,8 @@
-from openai import OpenAI
-from typing import List, Dict, Any, Optional
+from openai import OpenAI, BadRequestError
+from typing import List, Dict, Any, Optional, Tuple
 from core.interfaces.llm import LLMInterface
+from core.utils.tokens import estimate_tokens
+from core.utils.rate_limiter import RateLimiter
 import config
 import json
 import time
@@ -8,6 +10,7 @@ import time
 class OpenAILLM(LLMInterface):
     def __init__(self):
         self.client = OpenAI(api_key=config.OPENAI_API_KEY)
+        self.rate_limiter = RateLimiter(config.OPENAI_REQUESTS_PER_MINUTE)
         
     def generate(self, prompt: str, system_prompt: Optional[str] = None, temperature: float = 0.7) -> str:
         messages = []
@@ -18,6 +21,7 @@ class OpenAILLM(LLMInterface):
         max_retries = 3
         for attempt in range(max_retries):
             try:
+                self.rate_limiter.acquire()
                 response = self.client.chat.completions.create(
                     model=config.LLM_MODEL,
                     messages=messages,
@@ -41,6 +45,7 @@ class OpenAILLM(LLMInterface):
         max_retries = 3
         for attempt in range(max_retries):
             try:
+                self.rate_limiter.acquire()
                 response = self.client.embeddings.create(
                     model=config.EMBEDDING_MODEL,
                     input=text
@@ -53,6 +58,65 @@ class OpenAILLM(LLMInterface):
                     print(f"Error generating embedding: {str(e)}")
                     return []
         
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed many texts with as few requests as possible, preserving input order"""
+        embeddings: List[List[float]] = [[] for _ in texts]
+        
+        # Truncate like generate_embedding and skip blanks, which the API rejects
+        inputs = [(i, text[:8000]) for i, text in enumerate(texts) if text and text.strip()]
+        
+        for batch in self._pack_embedding_batches(inputs):
+            for i, embedding in self._embed_batch(batch):
+                embeddings[i] = embedding
+                
+        return embeddings
+        
+    def _pack_embedding_batches(self, inputs: List[Tuple[int, str]]) -> List[List[Tuple[int, str]]]:
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for i, text in inputs:
+            tokens = estimate_tokens(text)
+            if batch and (batch_tokens + tokens > config.EMBEDDING_BATCH_MAX_TOKENS or
+                          len(batch) >= config.EMBEDDING_BATCH_MAX_INPUTS):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append((i, text))
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+        
+    def _embed_batch(self, batch: List[Tuple[int, str]]) -> List[Tuple[int, List[float]]]:
+        """Embed one request batch.
+
+        A rejected input (400, e.g. too long) fails the same way on every attempt, so the batch is split
+        right away until the offending input is isolated and skipped. Transient errors (rate limits,
+        5xx, connection) are retried on the same batch and then raised; splitting would only multiply
+        the requests that are failing anyway.
+        """
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                self.rate_limiter.acquire()
+                response = self.client.embeddings.create(
+                    model=config.EMBEDDING_MODEL,
+                    input=[text for _, text in batch]
+                )
+                return [(batch[item.index][0], item.embedding) for item in response.data]
+            except BadRequestError as e:
+                if len(batch) > 1:
+                    middle = len(batch) // 2
+                    return self._embed_batch(batch[:middle]) + self._embed_batch(batch[middle:])
+                print(f"Error generating embedding: {str(e)}")
+                return []
+            except Exception as e:
+                if attempt < max_retries - 1:
+                    time.sleep(2 ** attempt)
+                else:
+                    raise e
+        
     def batch_generate(self, prompts: List[str], system_prompt: Optional[str] = None) -> List[str]:
         results = []
         for prompt in prompts:
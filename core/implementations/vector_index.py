@@ -0,0 +1,281 @@
+from typing import List, Dict, Tuple, Optional
+from pathlib import Path
+import numpy as np
+from core.utils.vectors import normalize_rows, top_k
+import config
+
+
+class FlatIndex:
+    """Exact cosine search over a pre-normalized float32 matrix"""
+
+    kind = "flat"
+
+    def __init__(self, dimensions: Optional[int] = None):
+        self.dimensions = dimensions
+        self._matrix = np.empty((0, dimensions or 0), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._rows
+
+    def add(self, ids: List[str], vectors: np.ndarray):
+        """Add or replace vectors; rows whose norm is zero are skipped"""
+        vectors = normalize_rows(vectors)
+        if vectors.shape[0] == 0:
+            return
+
+        if self.dimensions is None:
+            self.dimensions = vectors.shape[1]
+            self._matrix = np.empty((0, self.dimensions), dtype=np.float32)
+        elif vectors.shape[1] != self.dimensions:
+            raise ValueError(f"Expected {self.dimensions} dimensions, got {vectors.shape[1]}")
+
+        self.remove([doc_id for doc_id in ids if doc_id in self._rows])
+
+        keep = np.linalg.norm(vectors, axis=1) > 0
+        ids = [doc_id for doc_id, ok in zip(ids, keep) if ok]
+        vectors = vectors[keep]
+        if not ids:
+            return
+
+        start = self._size
+        self._reserve(start + len(ids))
+        self._matrix[start:start + len(ids)] = vectors
+        self._alive[start:start + len(ids)] = True
+        for offset, doc_id in enumerate(ids):
+            self._ids.append(doc_id)
+            self._rows[doc_id] = start + offset
+        self._size += len(ids)
+        self._on_add(np.arange(start, start + len(ids)), vectors)
+
+    def remove(self, ids: List[str]):
+        for doc_id in ids:
+            row = self._rows.pop(doc_id, None)
+            if row is not None:
+                self._alive[row] = False
+                self._ids[row] = None
+
+        # Compact once a quarter of the rows are tombstones
+        if self._size and len(self._rows) < self._size * 0.75:
+            self._compact()
+
+    def search(self, query_vector: np.ndarray, k: int = 10) -> List[Tuple[str, float]]:
+        query = normalize_rows(query_vector).reshape(-1)
+        if not self._rows or query.shape[0] != self.dimensions or not np.any(query):
+            return []
+
+        rows = self._candidate_rows(query)
+        if rows is None:
+            rows = np.arange(self._size)
+            scores = self._matrix[:self._size] @ query
+            scores[~self._alive[:self._size]] = -np.inf
+        else:
+            scores = self._matrix[rows] @ query
+
+        return [(self._ids[rows[i]], float(scores[i])) for i in top_k(scores, k) if np.isfinite(scores[i])]
+
+    def search_batch(self, query_vectors: np.ndarray, k: int = 10) -> List[List[Tuple[str, float]]]:
+        """Exact top-k for a batch of queries with a single matrix product"""
+        queries = normalize_rows(query_vectors)
+        if not self._rows or queries.shape[1] != self.dimensions:
+            return [[] for _ in range(len(queries))]
+
+        scores = queries @ self._matrix[:self._size].T
+        scores[:, ~self._alive[:self._size]] = -np.inf
+        top = top_k(scores, k)
+
+        results = []
+        for q, rows in enumerate(top):
+            if not np.any(queries[q]):
+                results.append([])
+                continue
+            results.append([(self._ids[row], float(scores[q, row])) for row in rows if np.isfinite(scores[q, row])])
+        return results
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._compact()
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **self._state())
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "FlatIndex":
+        with np.load(path, allow_pickle=False) as data:
+            kind = str(data['kind'])
+            index_cls = IVFIndex if kind == IVFIndex.kind else FlatIndex
+            index = index_cls.__new__(index_cls)
+            index._restore(data)
+        return index
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        return {
+            'kind': np.array(self.kind),
+            'ids': np.array(self._ids[:self._size], dtype=str),
+            'matrix': self._matrix[:self._size],
+        }
+
+    def _restore(self, data):
+        self._matrix = np.ascontiguousarray(data['matrix'], dtype=np.float32)
+        self._size = self._matrix.shape[0]
+        self.dimensions = self._matrix.shape[1] if self._size else None
+        self._ids = [str(doc_id) for doc_id in data['ids']]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._alive = np.ones(self._size, dtype=bool)
+
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        return None
+
+    def _on_add(self, rows: np.ndarray, vectors: np.ndarray):
+        pass
+
+    def _on_compact(self, kept_rows: np.ndarray):
+        pass
+
+    def _reserve(self, size: int):
+        capacity = self._matrix.shape[0]
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 1024)
+        matrix = np.empty((capacity, self.dimensions), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._matrix, self._alive = matrix, alive
+
+    def _compact(self):
+        kept_rows = np.flatnonzero(self._alive[:self._size])
+        if len(kept_rows) == self._size:
+            return
+        self._matrix = np.ascontiguousarray(self._matrix[kept_rows])
+        self._alive = np.ones(len(kept_rows), dtype=bool)
+        self._ids = [self._ids[row] for row in kept_rows]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._size = len(kept_rows)
+        self._on_compact(kept_rows)
+
+
+class IVFIndex(FlatIndex):
+    """Inverted-file index: spherical k-means lists, probing the nearest n_probe lists per query"""
+
+    kind = "ivf"
+
+    def __init__(self, dimensions: Optional[int] = None, n_probe: Optional[int] = None):
+        super().__init__(dimensions)
+        self.n_probe = n_probe or config.VECTOR_INDEX_NPROBE
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._lists: List[np.ndarray] = []
+
+    def train(self, vectors: np.ndarray, iterations: Optional[int] = None, seed: int = 0):
+        vectors = normalize_rows(vectors)
+        n_lists = max(1, int(np.sqrt(len(vectors))))
+        iterations = iterations or config.VECTOR_INDEX_TRAIN_ITERATIONS
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(len(vectors), n_lists * 256)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = self._assign(sample, centroids)
+            counts = np.bincount(labels, minlength=n_lists)
+            starts = np.cumsum(counts) - counts
+            empty = counts == 0
+            sums = np.zeros_like(centroids)
+            sums[~empty] = np.add.reduceat(sample[np.argsort(labels, kind='stable')], starts[~empty], axis=0)
+            # Reseed empty lists with random sample points
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        self._centroids = centroids
+        self.dimensions = centroids.shape[1]
+        if self._matrix.shape[1] != self.dimensions:
+            self._matrix = np.empty((0, self.dimensions), dtype=np.float32)
+        self._assignments = self._assign(self._matrix[:self._size], centroids)
+        self._rebuild_lists()
+
+    def search_batch(self, query_vectors: np.ndarray, k: int = 10) -> List[List[Tuple[str, float]]]:
+        # Each query probes its own lists, so there is no shared matrix to multiply against
+        if self._centroids is None:
+            return super().search_batch(query_vectors, k)
+        return [self.search(query, k) for query in normalize_rows(query_vectors)]
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        if self._centroids is None:
+            return None
+        n_probe = min(self.n_probe, len(self._centroids))
+        probes = np.argpartition(-(self._centroids @ query), n_probe - 1)[:n_probe]
+        rows = np.concatenate([self._lists[p] for p in probes])
+        return rows[self._alive[rows]]
+
+    def _on_add(self, rows: np.ndarray, vectors: np.ndarray):
+        if self._centroids is None:
+            return
+        labels = self._assign(vectors, self._centroids)
+        assignments = np.empty(self._size, dtype=np.int32)
+        assignments[:len(self._assignments)] = self._assignments
+        assignments[rows] = labels
+        self._assignments = assignments
+        for label in np.unique(labels):
+            self._lists[label] = np.concatenate([self._lists[label], rows[labels == label]])
+
+    def _on_compact(self, kept_rows: np.ndarray):
+        if self._centroids is not None:
+            self._assignments = self._assignments[kept_rows]
+            self._rebuild_lists()
+
+    def _rebuild_lists(self):
+        order = np.argsort(self._assignments, kind='stable')
+        bounds = np.searchsorted(self._assignments[order], np.arange(len(self._centroids) + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self._centroids))]
+
+    def _state(self) -> Dict[str, np.ndarray]:
+        state = super()._state()
+        if self._centroids is None:
+            state['kind'] = np.array(FlatIndex.kind)
+            return state
+        state['centroids'] = self._centroids
+        state['assignments'] = self._assignments[:self._size]
+        state['n_probe'] = np.array(self.n_probe)
+        return state
+
+    def _restore(self, data):
+        super()._restore(data)
+        self.n_probe = int(data['n_probe'])
+        self._centroids = np.ascontiguousarray(data['centroids'], dtype=np.float32)
+        self._assignments = np.asarray(data['assignments'], dtype=np.int32)
+        self._rebuild_lists()
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 16384) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk_size):
+            labels[start:start + chunk_size] = np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+        return labels
+
+
+def build_index(ids: List[str], vectors: np.ndarray, index_type: Optional[str] = None) -> FlatIndex:
+    """Build the configured index type, falling back to exact search for small corpora"""
+    index_type = index_type or config.VECTOR_INDEX_TYPE
+    vectors = np.asarray(vectors, dtype=np.float32)
+
+    if index_type == IVFIndex.kind and len(ids) >= config.VECTOR_INDEX_MIN_IVF_SIZE:
+        index = IVFIndex(vectors.shape[1])
+        index.train(vectors)
+    else:
+        index = FlatIndex(vectors.shape[1] if vectors.ndim == 2 else None)
+
+    index.add(ids, vectors)
+    return index
@@ -10,6 +10,10 @@ class LLMInterface(ABC):
     def generate_embedding(self, text: str) -> List[float]:
         pass
     
+    @abstractmethod
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        pass
+    
     @abstractmethod
     def batch_generate(self, prompts: List[str], system_prompt: Optional[str] = None) -> List[str]:
         pass
\ No newline at end of file
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterator
+from core.utils.bulk_writer import BulkWriter
 
 class StorageInterface(ABC):
     @abstractmethod
@@ -26,10 +27,26 @@ class StorageInterface(ABC):
     def find(self, collection: str, query: Dict[str, Any], limit: Optional[int] = None) -> List[Dict[str, Any]]:
         pass
     
+    @abstractmethod
+    def find_iter(self, collection: str, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None,
+                  batch_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Stream matching documents from a cursor, batch_size at a time, with only the projected fields"""
+        pass
+    
     @abstractmethod
     def update_one(self, collection: str, query: Dict[str, Any], update: Dict[str, Any]) -> bool:
         pass
     
     @abstractmethod
     def delete_one(self, collection: str, query: Dict[str, Any]) -> bool:
+        pass
+    
+    @abstractmethod
+    def bulk_write(self, collection: str, operations: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Apply insert/replace/update operations unordered in as few round-trips as possible"""
+        pass
+    
+    @abstractmethod
+    def bulk_writer(self, collection: str, flush_size: Optional[int] = None) -> "BulkWriter":
+        """Buffered writer for a collection, flushed every flush_size operations and on close"""
         pass
\ No newline at end of file
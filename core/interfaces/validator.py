@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 class ValidatorInterface(ABC):
     @abstractmethod
@@ -7,5 +7,6 @@ class ValidatorInterface(ABC):
         pass
     
     @abstractmethod
-    def validate_batch(self, data_list: List[Dict[str, Any]], validation_prompt: str) -> List[Dict[str, Any]]:
+    def validate_batch(self, data_list: List[Dict[str, Any]], validation_prompt: str,
+                       pack_size: Optional[int] = None) -> List[Dict[str, Any]]:
         pass
\ No newline at end of file
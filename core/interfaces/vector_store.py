@@ -7,13 +7,29 @@ class VectorStoreInterface(ABC):
         pass
     
     @abstractmethod
-    def insert_vectors(self, collection: str, documents: List[Dict[str, Any]]):
+    def insert_vectors(self, collection: str, documents: List[Dict[str, Any]]) -> List[str]:
+        pass
+    
+    @abstractmethod
+    def remove_vectors(self, collection: str, document_ids: List[str]):
+        pass
+    
+    @abstractmethod
+    def persist_index(self, collection: str):
         pass
     
     @abstractmethod
     def search_similar(self, collection: str, query_vector: List[float], k: int = 10) -> List[Tuple[Dict[str, Any], float]]:
         pass
     
+    @abstractmethod
+    def search_similar_batch(self, collection: str, query_vectors: List[List[float]], k: int = 10) -> List[List[Tuple[Dict[str, Any], float]]]:
+        pass
+    
+    @abstractmethod
+    def invalidate_index(self, collection: str):
+        pass
+    
     @abstractmethod
     def update_vector(self, collection: str, document_id: str, vector: List[float]):
         pass
\ No newline at end of file
@@ -17,6 +17,7 @@ class Email:
     is_internal: bool
     embedding: Optional[List[float]]
     metadata: Dict[str, Any]
+    source_file: Optional[str] = None
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -32,5 +33,6 @@ class Email:
             'thread_id': self.thread_id,
             'is_internal': self.is_internal,
             'embedding': self.embedding,
-            'metadata': self.metadata
+            'metadata': self.metadata,
+            'source_file': self.source_file
         }
\ No newline at end of file
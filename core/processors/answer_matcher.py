@@ -0,0 +1,157 @@
+from typing import List, Dict, Tuple, Optional, Sequence
+from core.interfaces.llm import LLMInterface
+from core.utils.vectors import cosine_similarity_matrix
+import config
+import json
+import numpy as np
+
+class AnswerMatcher:
+    """Decides which answer references refer to which questions.
+
+    All questions and answer references of a thread (or of a pair of threads) are embedded in one
+    batch and compared with one similarity matmul. Confident matches and mismatches are settled by
+    the thresholds; only the borderline band goes to the LLM, batched into one prompt.
+    Decisions are remembered for the rest of the run.
+    """
+
+    def __init__(self, llm: LLMInterface,
+                 accept_threshold: Optional[float] = None,
+                 reject_threshold: Optional[float] = None,
+                 use_embeddings: bool = True,
+                 batch_size: Optional[int] = None,
+                 memoize: bool = True):
+        self.llm = llm
+        self.accept_threshold = config.QA_MATCH_ACCEPT_THRESHOLD if accept_threshold is None else accept_threshold
+        self.reject_threshold = config.QA_MATCH_REJECT_THRESHOLD if reject_threshold is None else reject_threshold
+        self.use_embeddings = use_embeddings
+        self.batch_size = batch_size or config.QA_MATCH_LLM_BATCH_SIZE
+        self.memoize = memoize
+        self._decisions: Dict[Tuple[str, str], bool] = {}
+        self._embeddings: Dict[str, np.ndarray] = {}
+        self.stats = {'pairs': 0, 'accepted': 0, 'rejected': 0, 'borderline': 0,
+                      'llm_calls': 0, 'embedding_calls': 0}
+
+    def match_matrix(self, questions: Sequence[str], answer_refs: Sequence[str],
+                     mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Boolean matrix with [i, j] True when answer_refs[j] answers questions[i].
+
+        Pairs where mask is False (e.g. an answer sent before the question) are not decided and stay False.
+        """
+        matches = np.zeros((len(questions), len(answer_refs)), dtype=bool)
+        undecided: List[Tuple[int, int]] = []
+        for i, question in enumerate(questions):
+            for j, answer_ref in enumerate(answer_refs):
+                if mask is not None and not mask[i, j]:
+                    continue
+                decision = self._known_decision(question, answer_ref)
+                if decision is None:
+                    undecided.append((i, j))
+                else:
+                    matches[i, j] = decision
+        if not undecided:
+            return matches
+
+        decided: Dict[Tuple[str, str], bool] = {}
+        borderline, seen = [], set()
+        for (i, j), similarity in zip(undecided, self._similarities(questions, answer_refs, undecided)):
+            key = (questions[i], answer_refs[j])
+            if key in seen:
+                continue
+            seen.add(key)
+            self.stats['pairs'] += 1
+            if similarity is not None and similarity >= self.accept_threshold:
+                self.stats['accepted'] += 1
+                decided[key] = True
+            elif similarity is not None and similarity < self.reject_threshold:
+                self.stats['rejected'] += 1
+                decided[key] = False
+            else:
+                borderline.append((questions[i], answer_refs[j], similarity))
+
+        if borderline:
+            self.stats['borderline'] += len(borderline)
+            decided.update(self._decide_with_llm(borderline))
+
+        if self.memoize:
+            self._decisions.update(decided)
+        for i, j in undecided:
+            matches[i, j] = decided.get((questions[i], answer_refs[j]), False)
+        return matches
+
+    def matches(self, question: str, answer_ref: str) -> bool:
+        return bool(self.match_matrix([question], [answer_ref])[0, 0])
+
+    def _known_decision(self, question: str, answer_ref: str) -> Optional[bool]:
+        if not question or not answer_ref:
+            return False
+        # Simple check first
+        if question.lower() in answer_ref.lower() or answer_ref.lower() in question.lower():
+            return True
+        return self._decisions.get((question, answer_ref))
+
+    def _similarities(self, questions: Sequence[str], answer_refs: Sequence[str],
+                      pairs: List[Tuple[int, int]]) -> List[Optional[float]]:
+        if not self.use_embeddings:
+            return [None] * len(pairs)
+
+        texts = list(dict.fromkeys([questions[i] for i, _ in pairs] + [answer_refs[j] for _, j in pairs]))
+        missing = [text for text in texts if text not in self._embeddings]
+        if missing:
+            try:
+                self.stats['embedding_calls'] += 1
+                for text, vector in zip(missing, self.llm.generate_embeddings(missing)):
+                    self._embeddings[text] = np.asarray(vector, dtype=np.float32)
+            except Exception as e:
+                print(f"Error embedding questions/answers, falling back to the LLM: {str(e)}")
+                return [None] * len(pairs)
+
+        question_rows = list(dict.fromkeys(questions[i] for i, _ in pairs))
+        answer_rows = list(dict.fromkeys(answer_refs[j] for _, j in pairs))
+        if len({self._embeddings[text].shape for text in question_rows + answer_rows}) != 1:
+            return [None] * len(pairs)
+
+        matrix = cosine_similarity_matrix(np.vstack([self._embeddings[text] for text in question_rows]),
+                                          np.vstack([self._embeddings[text] for text in answer_rows]))
+        question_index = {text: row for row, text in enumerate(question_rows)}
+        answer_index = {text: column for column, text in enumerate(answer_rows)}
+        return [float(matrix[question_index[questions[i]], answer_index[answer_refs[j]]]) for i, j in pairs]
+
+    def _decide_with_llm(self, borderline: List[Tuple[str, str, Optional[float]]]) -> Dict[Tuple[str, str], bool]:
+        decided = {}
+        size = self.batch_size if self.batch_size > 0 else len(borderline)
+        for start in range(0, len(borderline), size):
+            chunk = borderline[start:start + size]
+            decisions = self._ask_llm([(q, a) for q, a, _ in chunk])
+            for (question, answer_ref, similarity), decision in zip(chunk, decisions):
+                if decision is None:
+                    # Unparseable reply: lean on the similarity when there is one
+                    midpoint = (self.accept_threshold + self.reject_threshold) / 2
+                    decision = similarity is not None and similarity >= midpoint
+                decided[(question, answer_ref)] = decision
+        return decided
+
+    def _ask_llm(self, pairs: List[Tuple[str, str]]) -> List[Optional[bool]]:
+        self.stats['llm_calls'] += 1
+        if len(pairs) == 1:
+            prompt = f"""Does this answer reference match this question? Answer YES or NO.
+Question: {pairs[0][0]}
+Answer reference: {pairs[0][1]}"""
+            try:
+                return ['YES' in self.llm.generate(prompt, temperature=0.1).upper()]
+            except Exception:
+                return [None]
+
+        numbered = "\n".join(f"{n}. Question: {question}\n   Answer reference: {answer_ref}"
+                             for n, (question, answer_ref) in enumerate(pairs, 1))
+        prompt = f"""For each numbered pair below, decide whether the answer reference answers the question.
+Return only a JSON array of {len(pairs)} booleans, one per pair, in order.
+
+{numbered}"""
+        try:
+            response = self.llm.generate(prompt, temperature=0.1).strip()
+            parsed = json.loads(response[response.find('['):response.rfind(']') + 1])
+        except Exception:
+            return [None] * len(pairs)
+        if not isinstance(parsed, list) or len(parsed) != len(pairs):
+            return [None] * len(pairs)
+        return [value if isinstance(value, bool) else None for value in parsed]
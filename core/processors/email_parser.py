@@ -1,16 +1,36 @@
 # /home/gyorkosdominik/_work/portfolio-health-system/core/processors/email_parser.py
 import json
-from typing import List, Dict, Any, Optional
+import os
+from typing import List, Dict, Any, Optional, Tuple, Set, Callable
+from concurrent.futures import ThreadPoolExecutor
 from core.models.email import Email
 from core.interfaces.llm import LLMInterface
+from core.utils.subjects import has_reply_prefix, strip_reply_prefix
+from core.utils.tokens import estimate_tokens
 import config
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 import re
 
+_HEADER_LINE = re.compile(r'^(From|To|Cc|Bcc|Date|Subject|Attachments?):\s*(.*)$', re.IGNORECASE)
+_ADDRESS = re.compile(r'[<(]?([^\s<>()",;]+@[^\s<>()",;]+?)[>)]?(?=[\s,;]|$)')
+_FORWARD_MARKER = re.compile(r'^\s*-+\s*(forwarded|original) message\s*-+\s*$', re.IGNORECASE)
+_DATE_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y.%m.%d %H:%M', '%Y-%m-%d %H:%M', '%Y.%m.%d %H:%M:%S']
+
+class PartialParseError(Exception):
+    """Some LLM chunks of a file failed; emails holds what the other chunks produced"""
+    
+    def __init__(self, source: str, emails: List[Email], failed_ranges: List[Tuple[int, int]]):
+        ranges = ", ".join(f"{first}-{last}" for first, last in failed_ranges)
+        super().__init__(f"LLM parsing failed for messages {ranges} of {source or 'email file'}")
+        self.emails = emails
+        self.failed_ranges = failed_ranges
+
 class EmailParser:
     def __init__(self, llm: Optional[LLMInterface] = None):
         self.llm = llm
         self.colleagues = self._load_colleagues()
+        self._addresses_by_name = self._index_colleague_names()
         
     def _load_colleagues(self) -> Dict[str, str]:
         colleagues = {}
@@ -18,7 +38,7 @@ class EmailParser:
             with open(config.COLLEAGUES_FILE, 'r', encoding='utf-8') as f:
                 for line in f:
                     if '@kisjozsitech.hu' in line:
-                        match = re.search(r'([^:]+?)\s*\(([^@]+@kisjozsitech\.hu)\)', line)
+                        match = re.search(r'([^:()]+?)\s*\(([^()@\s]+@kisjozsitech\.hu)\)', line)
                         if match:
                             name, email = match.groups()
                             colleagues[email.strip()] = name.strip()
@@ -26,6 +46,13 @@ class EmailParser:
             pass
         return colleagues
         
+    def _index_colleague_names(self) -> Dict[str, str]:
+        """Lower-cased name -> address; a name shared by colleagues with different addresses stays unresolved"""
+        addresses_by_name: Dict[str, Set[str]] = {}
+        for email, name in self.colleagues.items():
+            addresses_by_name.setdefault(name.lower(), set()).add(email)
+        return {name: addresses.pop() for name, addresses in addresses_by_name.items() if len(addresses) == 1}
+        
     def parse_email_file(self, filepath: str) -> List[Email]:
         with open(filepath, 'r', encoding='utf-8') as f:
             content = f.read()
@@ -33,8 +60,14 @@ class EmailParser:
         if not self.llm:
             raise ValueError("LLM instance required for parsing")
             
-        # Use LLM to parse the email content WITH REPLY DETECTION
-        emails_data = self._parse_with_llm(content)
+        # Headers are parsed locally; the LLM only adds questions, answers and reply links.
+        # Files without regular header blocks are parsed entirely by the LLM.
+        source = os.path.basename(filepath)
+        emails_data = self._parse_headers(content)
+        if emails_data:
+            failed_ranges = self._add_semantic_fields(emails_data, source)
+        else:
+            emails_data, failed_ranges = self._parse_with_llm(content, source)
         
         emails = []
         for email_data in emails_data:
@@ -42,10 +75,249 @@ class EmailParser:
             if email:
                 emails.append(email)
                 
+        if failed_ranges:
+            # The caller decides whether a partly parsed file is worth keeping
+            raise PartialParseError(source, emails, failed_ranges)
         return emails
         
-    def _parse_with_llm(self, content: str) -> List[Dict[str, Any]]:
-        prompt = f"""Parse the following email file content and extract individual emails WITH REPLY RELATIONSHIPS. 
+    def _parse_headers(self, content: str) -> List[Dict[str, Any]]:
+        """Split a file into messages at their header blocks and parse the headers.
+
+        Returns [] unless every message has a sender and a parseable date.
+        """
+        lines = content.splitlines()
+        starts = [i for i, line in enumerate(lines) if self._starts_message(lines, i, {'from', 'date', 'subject'})]
+        if not starts:
+            return []
+        
+        emails_data = []
+        for start, end in zip(starts, starts[1:] + [len(lines)]):
+            data = self._parse_message(lines[start:end])
+            if not data:
+                return []
+            emails_data.append(data)
+        return emails_data
+        
+    def _starts_message(self, lines: List[str], i: int, required: Set[str]) -> bool:
+        """The first line of a header block with the required headers that isn't a forwarded copy"""
+        if not _HEADER_LINE.match(lines[i]) or (i > 0 and _HEADER_LINE.match(lines[i - 1])):
+            return False
+        previous = next((line for line in reversed(lines[:i]) if line.strip()), '')
+        if _FORWARD_MARKER.match(previous):
+            return False
+        names = set()
+        for line in lines[i:i + 8]:
+            match = _HEADER_LINE.match(line)
+            if not match:
+                break
+            names.add(match.group(1).lower())
+        return required <= names
+        
+    def _split_messages(self, content: str) -> List[str]:
+        """Split raw text at anything that looks like the start of a message, for chunking the full LLM parse"""
+        lines = content.splitlines()
+        starts = [i for i in range(len(lines)) if self._starts_message(lines, i, {'from'})]
+        if not starts:
+            return [content]
+        starts[0] = 0  # Keep any preamble with the first message
+        return ['\n'.join(lines[start:end]) for start, end in zip(starts, starts[1:] + [len(lines)])]
+        
+    def _parse_message(self, lines: List[str]) -> Optional[Dict[str, Any]]:
+        headers = {}
+        position = 0
+        while position < len(lines):
+            match = _HEADER_LINE.match(lines[position])
+            if match:
+                headers[match.group(1).lower()] = match.group(2).strip()
+            elif lines[position][:1] in (' ', '\t') and headers:
+                # Folded header continues the previous one
+                last = list(headers)[-1]
+                headers[last] = f"{headers[last]} {lines[position].strip()}"
+            else:
+                break
+            position += 1
+            
+        body_lines = lines[position:]
+        while body_lines and body_lines[0].strip() == '':
+            body_lines = body_lines[1:]
+        while body_lines and body_lines[-1].strip() in ('', '--'):
+            body_lines = body_lines[:-1]
+        body = '\n'.join(body_lines)
+        
+        senders = self._parse_addresses(headers.get('from', ''))
+        date = self._parse_date(headers.get('date', ''))
+        if not senders or not senders[0][1] or not date:
+            return None
+        
+        attachments = headers.get('attachments') or headers.get('attachment')
+        return {
+            'subject': headers.get('subject', ''),
+            'date': date.strftime('%Y-%m-%d %H:%M:%S'),
+            'from_email': senders[0][1],
+            'from_name': senders[0][0] or self.colleagues.get(senders[0][1], ''),
+            'to_emails': [address for _, address in self._parse_addresses(headers.get('to', '')) if address],
+            'cc_emails': [address for _, address in self._parse_addresses(headers.get('cc', '')) if address],
+            'body': body,
+            'attachments': [a.strip() for a in attachments.split(',') if a.strip()] if attachments else [],
+            'quoted_text': '\n'.join(line for line in body_lines if line.startswith('>'))
+        }
+        
+    def _parse_addresses(self, value: str) -> List[Tuple[str, str]]:
+        """(name, address) pairs from "Name addr", "Name <addr>", "Name (addr)" or bare colleague names"""
+        addresses = []
+        for part in re.split(r'[,;](?![^<(]*[>)])', value):
+            part = part.strip()
+            if not part:
+                continue
+            match = _ADDRESS.search(part)
+            if match:
+                name = (part[:match.start()] + part[match.end():]).strip().strip('"').strip()
+                addresses.append((name, match.group(1).strip().lower()))
+            else:
+                # Name without an address: resolve it from the colleague list, if possible
+                addresses.append((part, self._addresses_by_name.get(part.lower(), '')))
+        return addresses
+        
+    def _parse_date(self, value: str) -> Optional[datetime]:
+        """RFC 2822 dates (kept as the sender's local wall-clock time) and the legacy numeric formats"""
+        if not value:
+            return None
+        try:
+            return parsedate_to_datetime(value).replace(tzinfo=None)
+        except (TypeError, ValueError, IndexError):
+            pass
+        for fmt in _DATE_FORMATS:
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+        return None
+        
+    def _add_semantic_fields(self, emails_data: List[Dict[str, Any]], source: str = '') -> List[Tuple[int, int]]:
+        """Ask the LLM for questions, answers and reply links of already parsed messages.
+
+        Messages are sent in token-bounded chunks, concurrently; a failed chunk leaves its messages
+        without these fields. Returns the (first, last) message numbers of failed chunks.
+        """
+        labels = [f"[{i}] From: {data['from_name']} <{data['from_email']}> | Date: {data['date']} | "
+                  f"Subject: {data['subject']}" for i, data in enumerate(emails_data)]
+        texts = [label + "\n" + "\n".join(line for line in data['body'].splitlines() if not line.startswith('>'))
+                 for label, data in zip(labels, emails_data)]
+        
+        def extract(chunk: List[int]) -> List[Any]:
+            emails = "\n\n".join(texts[i] for i in chunk)
+            context = ''
+            if chunk[0] > 0:
+                context = (f"\nFor reply linking, the email just before these was (don't return it):\n"
+                           f"{labels[chunk[0] - 1]}\n")
+            prompt = f"""These are emails of one file, in order. For each email extract:
+- questions_asked: array of {{"question": "text", "needs_answer": true/false}}
+- answers_provided: array of {{"answer": "text", "answers_question": "the question being answered"}}
+- is_reply_to_subject: the original subject this email replies to, or null
+- replying_to_from: email address of the sender being replied to, or null
+- replying_to_date: date of the email being replied to (YYYY-MM-DD HH:MM:SS), or null
+
+Return ONLY a JSON array with one object per email, each with an "index" field matching the [n] label.
+{context}
+{emails}"""
+            parsed = self._load_json(self.llm.generate(prompt, temperature=0.1))
+            if not isinstance(parsed, list):
+                raise ValueError("response is not a JSON array")
+            return parsed
+        
+        semantic = {}
+        chunks = self._chunk(list(range(len(texts))), [estimate_tokens(text) for text in texts])
+        results, failed_ranges = self._run_chunks(chunks, extract, source)
+        for chunk, parsed in zip(chunks, results):
+            if parsed is None:
+                continue
+            unplaced = []
+            for position, fields in enumerate(parsed):
+                if not isinstance(fields, dict):
+                    continue
+                try:
+                    index = int(fields.get('index'))
+                except (TypeError, ValueError):
+                    index = None
+                if index in chunk:
+                    semantic[index] = fields
+                else:
+                    unplaced.append((position, fields))
+            for position, fields in unplaced:
+                # Missing, malformed or out-of-chunk index: trust the reply's order instead
+                if position < len(chunk) and chunk[position] not in semantic:
+                    semantic[chunk[position]] = fields
+            if any(i not in semantic for i in chunk):
+                print(f"Error parsing messages {chunk[0] + 1}-{chunk[-1] + 1} of {source or 'email file'} with LLM: "
+                      f"reply does not cover every message")
+                failed_ranges.append((chunk[0] + 1, chunk[-1] + 1))
+        
+        for i, data in enumerate(emails_data):
+            fields = semantic.get(i, {})
+            for key in ('questions_asked', 'answers_provided'):
+                data[key] = fields.get(key) if isinstance(fields.get(key), list) else []
+            for key in ('is_reply_to_subject', 'replying_to_from', 'replying_to_date'):
+                data[key] = fields.get(key)
+            if not data['is_reply_to_subject'] and has_reply_prefix(data['subject']):
+                # The subject line alone already says what this replies to
+                data['is_reply_to_subject'] = strip_reply_prefix(data['subject'])
+        return failed_ranges
+        
+    def _chunk(self, items: List[int], tokens: List[int]) -> List[List[int]]:
+        """Pack message indices in order into chunks of at most EMAIL_PARSE_CHUNK_TOKENS; a larger message gets its own chunk"""
+        chunks, chunk_tokens = [], 0
+        for item, item_tokens in zip(items, tokens):
+            if not chunks or chunk_tokens + item_tokens > config.EMAIL_PARSE_CHUNK_TOKENS:
+                chunks.append([])
+                chunk_tokens = 0
+            chunks[-1].append(item)
+            chunk_tokens += item_tokens
+        return chunks
+        
+    def _run_chunks(self, chunks: List[List[int]], parse_chunk: Callable[[List[int]], Any],
+                    source: str) -> Tuple[List[Any], List[Tuple[int, int]]]:
+        """Parse chunks concurrently; results in order (None for failed chunks) and the failed message ranges"""
+        def run(numbered: Tuple[int, List[int]]) -> Any:
+            number, chunk = numbered
+            try:
+                return parse_chunk(chunk)
+            except Exception as e:
+                print(f"Error parsing chunk {number + 1}/{len(chunks)} (messages {chunk[0] + 1}-{chunk[-1] + 1}) "
+                      f"of {source or 'email file'} with LLM: {str(e)}")
+                return None
+        
+        if len(chunks) <= 1:
+            results = [run((0, chunk)) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=min(config.EMAIL_PARSE_CONCURRENCY, len(chunks))) as pool:
+                results = list(pool.map(run, enumerate(chunks)))
+        failed_ranges = [(chunk[0] + 1, chunk[-1] + 1) for chunk, result in zip(chunks, results) if result is None]
+        return results, failed_ranges
+        
+    def _load_json(self, response: str) -> Any:
+        # Clean the response to ensure valid JSON
+        response = response.strip()
+        if response.startswith('```json'):
+            response = response[7:]
+        if response.endswith('```'):
+            response = response[:-3]
+        return json.loads(response.strip())
+        
+    def _parse_with_llm(self, content: str, source: str = '') -> Tuple[List[Dict[str, Any]], List[Tuple[int, int]]]:
+        """Full LLM parse for files without regular headers, in concurrent message-aligned chunks.
+
+        Returns the parsed emails and the (first, last) message numbers of failed chunks.
+        """
+        messages = self._split_messages(content)
+        
+        def parse(chunk: List[int]) -> List[Any]:
+            chunk_content = "\n".join(messages[i] for i in chunk)
+            context = ''
+            if chunk[0] > 0:
+                previous_headers = messages[chunk[0] - 1].strip().split('\n\n')[0]
+                context = (f"\nThe email just before this content (for reply relationships only, "
+                           f"don't extract it):\n{previous_headers}\n")
+            prompt = f"""Parse the following email file content and extract individual emails WITH REPLY RELATIONSHIPS. 
 
 CRITICAL TASKS:
 1. Extract all individual emails from the content
@@ -68,29 +340,20 @@ Return a JSON array where each email object contains:
 - questions_asked: array of objects with format {{"question": "text", "needs_answer": true/false}}
 - answers_provided: array of objects with format {{"answer": "text", "answers_question": "the question being answered"}}
 - quoted_text: string (any quoted text from previous emails)
-
+{context}
 Email content:
-{content}
+{chunk_content}
 
 Return ONLY the JSON array, no other text."""
-
-        try:
-            response = self.llm.generate(prompt, temperature=0.1)
-            # Clean the response to ensure valid JSON
-            response = response.strip()
-            if response.startswith('```json'):
-                response = response[7:]
-            if response.endswith('```'):
-                response = response[:-3]
-            response = response.strip()
-            
-            parsed = json.loads(response)
-            if isinstance(parsed, list):
-                return parsed
-            return []
-        except Exception as e:
-            print(f"Error parsing with LLM: {str(e)}")
-            return []
+            parsed = self._load_json(self.llm.generate(prompt, temperature=0.1))
+            if not isinstance(parsed, list):
+                raise ValueError("response is not a JSON array")
+            return parsed
+        
+        chunks = self._chunk(list(range(len(messages))), [estimate_tokens(message) for message in messages])
+        results, failed_ranges = self._run_chunks(chunks, parse, source)
+        # Stitched back in file order
+        return [email for parsed in results for email in parsed or []], failed_ranges
             
     def _create_email_from_parsed_data(self, data: Dict[str, Any]) -> Optional[Email]:
         try:
@@ -1,47 +1,46 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from core.models.thread import Thread
 from core.models.priority import Priority
 from core.interfaces.llm import LLMInterface
 from core.interfaces.validator import ValidatorInterface
+from core.utils.tokens import estimate_tokens
 from datetime import datetime
+import threading
 import json
 import config
 
+ISSUE_SEVERITIES = ("critical", "high", "medium", "low")
+
 class PriorityCalculator:
-    def __init__(self, llm: LLMInterface, validator: ValidatorInterface):
+    def __init__(self, llm: LLMInterface, validator: ValidatorInterface, mode: Optional[str] = None):
         self.llm = llm
         self.validator = validator
+        self.mode = mode or config.PRIORITY_ASSESSMENT_MODE
+        self.token_usage: Dict[str, Dict[str, int]] = {}
+        self.fused_fallbacks = 0
+        self._usage_lock = threading.Lock()
         
     def calculate_priorities(self, thread: Thread) -> Priority:
-        attention_scores = self._calculate_attention_scores(thread)
-        issues = self._identify_issues(thread)
-        recommendations = self._generate_recommendations(thread, issues)
-        
-        priority_data = {
-            'thread_id': thread.id,
-            'attention_flags': attention_scores,
-            'issues': issues,
-            'recommendations': recommendations,
-            'days_stalled': (datetime.now() - thread.last_activity).days,
-            'external_participants': thread.external_participants
-        }
-        
-        validated_scores = []
-        for _ in range(config.VALIDATION_ROUNDS):
-            validation_result = self.validator.validate(
-                priority_data,
-                self._get_validation_prompt()
-            )
-            if validation_result.get('score'):
-                validated_scores.append(validation_result['score'])
-                
-        final_score = sum(validated_scores) / len(validated_scores) if validated_scores else 0.0
+        priority = self.assess_thread(thread)
+        self.validate_priorities([priority])
+        return priority
+        
+    def assess_thread(self, thread: Thread) -> Priority:
+        """Score flags, issues and recommendations; the score is filled in by validate_priorities"""
+        assessment = self._assess_fused(thread) if self.mode == "fused" else None
+        if assessment is None:
+            attention_scores = self._calculate_attention_scores(thread)
+            issues = self._identify_issues(thread)
+            recommendations = self._generate_recommendations(thread, issues)
+        else:
+            attention_scores, issues, recommendations = assessment
+        self._count_thread("fused" if assessment is not None else "separate")
         
         return Priority(
             id=None,
             email_id=thread.email_ids[-1] if thread.email_ids else '',
             thread_id=thread.id,
-            score=final_score,
+            score=0.0,
             attention_flags=attention_scores,
             issues=issues,
             recommendations=recommendations,
@@ -51,9 +50,32 @@ class PriorityCalculator:
             external_participants=thread.external_participants,
             attachments=thread.attachments,
             created_at=datetime.now(),
-            validation_scores=validated_scores
+            validation_scores=[]
         )
         
+    def validate_priorities(self, priorities: List[Priority]):
+        """Validate all assessments (every round) in one validator batch and set their scores"""
+        # The round index keeps rounds apart, so a cached first round isn't copied into the others
+        items = [dict(self._validation_data(priority), validation_round=round_index)
+                 for priority in priorities for round_index in range(config.VALIDATION_ROUNDS)]
+        results = self.validator.validate_batch(items, self._get_validation_prompt()) if items else []
+        
+        for i, priority in enumerate(priorities):
+            rounds = results[i * config.VALIDATION_ROUNDS:(i + 1) * config.VALIDATION_ROUNDS]
+            priority.validation_scores = [result['score'] for result in rounds if result and result.get('score')]
+            priority.score = (sum(priority.validation_scores) / len(priority.validation_scores)
+                              if priority.validation_scores else 0.0)
+            
+    def _validation_data(self, priority: Priority) -> Dict[str, Any]:
+        return {
+            'thread_id': priority.thread_id,
+            'attention_flags': priority.attention_flags,
+            'issues': priority.issues,
+            'recommendations': priority.recommendations,
+            'days_stalled': priority.days_stalled,
+            'external_participants': priority.external_participants
+        }
+        
     def _calculate_attention_scores(self, thread: Thread) -> Dict[str, float]:
         prompt = f"""
         Analyze this email thread and score each attention flag from 0 to 1:
@@ -70,7 +92,7 @@ class PriorityCalculator:
         Return JSON object with scores for each flag.
         """
         
-        response = self.llm.generate(prompt, temperature=0.3)
+        response = self._generate(prompt, 0.3, "separate")
         try:
             scores = json.loads(response)
             return {flag: scores.get(flag, 0.0) for flag in config.ATTENTION_FLAGS}
@@ -97,7 +119,7 @@ class PriorityCalculator:
         ]
         """
         
-        response = self.llm.generate(prompt, temperature=0.3)
+        response = self._generate(prompt, 0.3, "separate")
         try:
             return json.loads(response)
         except:
@@ -113,12 +135,102 @@ class PriorityCalculator:
         Return JSON array of brief, actionable recommendations.
         """
         
-        response = self.llm.generate(prompt, temperature=0.5)
+        response = self._generate(prompt, 0.5, "separate")
         try:
             return json.loads(response)
         except:
             return []
             
+    def _assess_fused(self, thread: Thread) -> Optional[Tuple[Dict[str, float], List[Dict[str, Any]], List[str]]]:
+        """Flags, issues and recommendations from one call; None when the reply does not fit the schema"""
+        prompt = f"""
+        Assess this email thread. Score each attention flag, identify critical issues,
+        and recommend actions that address those issues.
+        
+        Subject: {thread.subject}
+        Days Stalled: {(datetime.now() - thread.last_activity).days}
+        Unresolved Questions: {json.dumps(thread.unresolved_questions)}
+        Blockers: {json.dumps(thread.blockers)}
+        External Participants: {len(thread.external_participants)}
+        
+        Attention flags to score from 0 to 1:
+        {json.dumps(config.ATTENTION_FLAGS)}
+        
+        Return only a JSON object with this format:
+        {{
+            "attention_flags": {{"<flag>": 0.0-1.0, ...}},
+            "issues": [
+                {{
+                    "type": "issue type",
+                    "severity": "critical/high/medium/low",
+                    "description": "detailed description",
+                    "impact": "business impact"
+                }}
+            ],
+            "recommendations": ["brief, actionable recommendation", ...]
+        }}
+        """
+        
+        response = ''
+        try:
+            response = self.llm.generate(prompt, temperature=0.3)
+            assessment = self._parse_fused_assessment(response)
+        except Exception:
+            assessment = None
+            
+        # A failed attempt is part of what the fallback path cost this thread
+        self._charge("fused" if assessment is not None else "separate", prompt, response)
+        if assessment is None:
+            with self._usage_lock:
+                self.fused_fallbacks += 1
+        return assessment
+        
+    def _parse_fused_assessment(self, response: str) -> Optional[Tuple[Dict[str, float], List[Dict[str, Any]], List[str]]]:
+        text = (response or '').strip()
+        if text.startswith('```'):
+            text = text.split('\n', 1)[-1].rsplit('```', 1)[0]
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None
+            
+        if not isinstance(data, dict):
+            return None
+        flags, issues, recommendations = data.get('attention_flags'), data.get('issues'), data.get('recommendations')
+        if not isinstance(flags, dict) or not isinstance(issues, list) or not isinstance(recommendations, list):
+            return None
+        if not all(isinstance(flags.get(flag), (int, float)) and 0 <= flags[flag] <= 1 for flag in config.ATTENTION_FLAGS):
+            return None
+        for issue in issues:
+            if not isinstance(issue, dict) or issue.get('severity') not in ISSUE_SEVERITIES \
+               or not all(isinstance(issue.get(field), str) for field in ('type', 'description', 'impact')):
+                return None
+        if not all(isinstance(recommendation, str) for recommendation in recommendations):
+            return None
+            
+        attention_scores = {flag: float(flags[flag]) for flag in config.ATTENTION_FLAGS}
+        return attention_scores, issues, recommendations
+        
+    def _usage(self, mode: str) -> Dict[str, int]:
+        return self.token_usage.setdefault(mode, {'threads': 0, 'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0})
+        
+    def _count_thread(self, mode: str):
+        with self._usage_lock:
+            self._usage(mode)['threads'] += 1
+        
+    def _generate(self, prompt: str, temperature: float, mode: str) -> str:
+        """Call the LLM and account estimated prompt/completion tokens under the given mode"""
+        response = self.llm.generate(prompt, temperature=temperature)
+        self._charge(mode, prompt, response)
+        return response
+        
+    def _charge(self, mode: str, prompt: str, response: str):
+        with self._usage_lock:
+            usage = self._usage(mode)
+            usage['calls'] += 1
+            usage['prompt_tokens'] += estimate_tokens(prompt)
+            usage['completion_tokens'] += estimate_tokens(response or '')
+        
     def _get_validation_prompt(self) -> str:
         return """
         Validate this priority assessment and provide a confidence score (0-1).
@@ -3,10 +3,14 @@ from core.models.email import Email
 from core.models.thread import Thread
 from core.interfaces.llm import LLMInterface
 from core.interfaces.vector_store import VectorStoreInterface
-from core.services.response_tracker import ResponseTracker
+from core.services.response_tracker import ResponseTracker, AnswerIndex
+from core.processors.answer_matcher import AnswerMatcher
 import json
+import re
 from datetime import datetime, timedelta, date
 from tqdm import tqdm
+from core.utils.vectors import cosine_similarity_matrix, normalize_rows, top_k
+from core.utils.subjects import subject_keys, normalize_subject, has_reply_prefix
 import config
 import numpy as np
 
@@ -14,18 +18,36 @@ class ThreadAnalyzer:
     def __init__(self, llm: LLMInterface, vector_store: VectorStoreInterface):
         self.llm = llm
         self.vector_store = vector_store
-        self.response_tracker = ResponseTracker(llm)
+        self.answer_matcher = AnswerMatcher(llm)
+        self.response_tracker = ResponseTracker(llm, self.answer_matcher)
         
     def analyze_threads(self, emails: List[Email]) -> List[Thread]:
         threads = []
-        processed_emails = set()
         
+        merged_groups = self.group_emails(emails)
+        
+        with tqdm(total=len(merged_groups), desc="Analyzing threads", unit="thread") as pbar:
+            for thread_emails in merged_groups:
+                thread = self.build_thread(thread_emails)
+                if thread:
+                    threads.append(thread)
+                        
+                pbar.update(1)
+                
+        return threads
+    
+    def group_emails(self, emails: List[Email]) -> List[List[Email]]:
+        """Group emails into conversation threads without building Thread objects"""
         valid_emails = [e for e in emails if e.id and e.date]
         
-        print(f"Grouping {len(valid_emails)} emails into threads using advanced LLM analysis...")
+        print(f"Grouping {len(valid_emails)} emails into threads...")
         
-        # First pass: Create initial thread groups using enhanced LLM analysis
-        thread_groups = self._identify_thread_groups_with_llm(valid_emails)
+        # First pass: Thread by reply headers and normalized subjects, the LLM only sees what those leave open
+        thread_groups, ambiguous = self._prethread_by_headers(valid_emails)
+        print(f"Threaded {len(valid_emails) - len(ambiguous)} emails into {len(thread_groups)} groups from headers, "
+              f"{len(ambiguous)} ambiguous emails left for LLM grouping")
+        if ambiguous:
+            thread_groups.extend(self._identify_thread_groups_with_llm(ambiguous))
         
         # Second pass: Find cross-thread connections using semantic similarity
         cross_thread_connections = self._find_cross_thread_connections(thread_groups, valid_emails)
@@ -35,31 +57,104 @@ class ThreadAnalyzer:
         
         print(f"Identified {len(merged_groups)} thread groups after advanced merging")
         
-        with tqdm(total=len(merged_groups), desc="Analyzing threads", unit="thread") as pbar:
-            for thread_emails in merged_groups:
-                if thread_emails:
-                    thread = self._create_thread_with_response_tracking(thread_emails)
-                    if thread:
-                        # Add enhanced daily response status
-                        daily_analysis = self._analyze_daily_responses_enhanced(thread_emails)
-                        thread.metadata['daily_response_status'] = daily_analysis['daily_status']
-                        thread.metadata['unanswered_today'] = daily_analysis['unanswered_today']
-                        thread.metadata['response_times_by_day'] = daily_analysis['response_times_by_day']
-                        threads.append(thread)
-                        
-                pbar.update(1)
+        return merged_groups
+    
+    def build_thread(self, thread_emails: List[Email]) -> Optional[Thread]:
+        """Build a Thread with response tracking and daily response status from its emails"""
+        if not thread_emails:
+            return None
+            
+        # One pass decides every question/answer pair; response chains and daily status both read it
+        answer_index = self.response_tracker.build_answer_index(thread_emails)
+        thread = self._create_thread_with_response_tracking(thread_emails, answer_index)
+        if thread:
+            # Add enhanced daily response status
+            daily_analysis = self._analyze_daily_responses_enhanced(thread_emails, answer_index)
+            thread.metadata['daily_response_status'] = daily_analysis['daily_status']
+            thread.metadata['unanswered_today'] = daily_analysis['unanswered_today']
+            thread.metadata['response_times_by_day'] = daily_analysis['response_times_by_day']
+            
+        return thread
+    
+    def _prethread_by_headers(self, emails: List[Email]) -> Tuple[List[List[Email]], List[Email]]:
+        """Deterministically thread emails onto earlier ones; returns the groups and the ambiguous emails.
+
+        Replies attach to the email they answer; emails without reply markers join an earlier email with
+        the same normalized subject and shared participants. What the headers can't settle goes to the LLM.
+        """
+        parent = list(range(len(emails)))
+        
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        seen_by_subject = {}  # normalized subject -> indices of earlier emails
+        unthreaded = set()
+        for i in sorted(range(len(emails)), key=lambda i: emails[i].date):
+            email = emails[i]
+            subject = normalize_subject(email.subject)
+            reply_subject = normalize_subject(email.metadata.get('is_reply_to_subject') or '')
+            is_reply = bool(reply_subject or email.metadata.get('replying_to_from') or has_reply_prefix(email.subject))
+            
+            if not (subject or reply_subject):
+                unthreaded.add(i)
+                continue
                 
-        return threads
+            candidates = seen_by_subject.get(reply_subject or subject, [])
+            if is_reply or candidates:
+                reply_parent = self._find_reply_parent(email, [emails[j] for j in candidates])
+                if reply_parent is None:
+                    unthreaded.add(i)
+                else:
+                    parent[find(i)] = find(candidates[reply_parent])
+                    
+            for key in {subject, reply_subject} - {''}:
+                seen_by_subject.setdefault(key, []).append(i)
+        
+        groups = {}
+        for i in range(len(emails)):
+            groups.setdefault(find(i), []).append(i)
+        
+        # A singleton stays ambiguous when it is an unattached reply, shares its subject with emails it
+        # has no participants in common with, or is an earlier email such emails could belong to
+        resolved, ambiguous = [], []
+        for members in groups.values():
+            i = members[0]
+            subject_users = seen_by_subject.get(normalize_subject(emails[i].subject), [])
+            if len(members) == 1 and (i in unthreaded or len(subject_users) > 1):
+                ambiguous.append(emails[i])
+            else:
+                resolved.append([emails[i] for i in members])
+                
+        ambiguous.sort(key=lambda e: e.date)
+        return resolved, ambiguous
+        
+    def _find_reply_parent(self, reply: Email, candidates: List[Email]) -> Optional[int]:
+        """Index of the email this reply most likely answers: the named sender first, then shared participants"""
+        replying_to = (reply.metadata.get('replying_to_from') or '').lower()
+        earlier = [i for i in range(len(candidates) - 1, -1, -1) if candidates[i].date <= reply.date]
+        
+        if replying_to:
+            for i in earlier:
+                sender = candidates[i]
+                if (sender.from_email and sender.from_email.lower() in replying_to) or \
+                   (sender.from_name and sender.from_name.lower() in replying_to):
+                    return i
+        
+        reply_participants = {p.lower() for p in [reply.from_email] + reply.to_emails + reply.cc_emails if p}
+        for i in earlier:
+            candidate = candidates[i]
+            participants = {p.lower() for p in [candidate.from_email] + candidate.to_emails + candidate.cc_emails if p}
+            if (reply.from_email and reply.from_email.lower() in participants) or \
+               (candidate.from_email and candidate.from_email.lower() in reply_participants):
+                return i
+        return None
     
     def _identify_thread_groups_with_llm(self, emails: List[Email]) -> List[List[Email]]:
         """Enhanced LLM grouping with better context understanding"""
         
-        # Generate embeddings for all emails for semantic similarity
-        email_embeddings = {}
-        for email in emails:
-            if email.embedding:
-                email_embeddings[email.id] = np.array(email.embedding)
-        
         # Prepare comprehensive email summaries
         email_summaries = []
         for i, email in enumerate(emails):
@@ -180,23 +275,27 @@ Return a detailed JSON object:
             summary = self._create_thread_summary(group)
             thread_summaries.append(summary)
         
-        # Compare each thread pair
-        for i in range(len(thread_groups)):
-            for j in range(i + 1, len(thread_groups)):
-                connection_score = self._calculate_thread_connection_score(
-                    thread_groups[i], 
-                    thread_groups[j],
-                    thread_summaries[i],
-                    thread_summaries[j]
-                )
-                
-                if connection_score['score'] > 0.7:
-                    connections.append({
-                        'thread1_idx': i,
-                        'thread2_idx': j,
-                        'score': connection_score['score'],
-                        'reasons': connection_score['reasons']
-                    })
+        # Only score pairs that a cheap blocking signal flags; scoring every pair is quadratic
+        centroids, has_embedding = self._normalized_centroids(thread_summaries)
+        candidate_pairs = self._candidate_pairs(thread_groups, thread_summaries, centroids, has_embedding)
+        
+        for i, j in sorted(candidate_pairs):
+            similarity = float(centroids[i] @ centroids[j]) if has_embedding[i] and has_embedding[j] else None
+            connection_score = self._calculate_thread_connection_score(
+                thread_groups[i], 
+                thread_groups[j],
+                thread_summaries[i],
+                thread_summaries[j],
+                similarity
+            )
+            
+            if connection_score['score'] > 0.7:
+                connections.append({
+                    'thread1_idx': i,
+                    'thread2_idx': j,
+                    'score': connection_score['score'],
+                    'reasons': connection_score['reasons']
+                })
         
         return connections
     
@@ -226,8 +325,8 @@ Return a detailed JSON object:
                 dates.append(email.date)
         
         # Generate thread embedding by averaging email embeddings
-        embeddings = [np.array(e.embedding) for e in emails if e.embedding]
-        avg_embedding = np.mean(embeddings, axis=0) if embeddings else None
+        embeddings = [e.embedding for e in emails if e.embedding is not None and len(e.embedding)]
+        avg_embedding = np.asarray(embeddings, dtype=np.float32).mean(axis=0) if embeddings else None
         
         return {
             'participants': list(participants),
@@ -243,15 +342,17 @@ Return a detailed JSON object:
                                          group1: List[Email], 
                                          group2: List[Email],
                                          summary1: Dict[str, Any],
-                                         summary2: Dict[str, Any]) -> Dict[str, Any]:
+                                         summary2: Dict[str, Any],
+                                         similarity: Optional[float] = None) -> Dict[str, Any]:
         """Calculate how likely two thread groups are connected"""
         
         score = 0.0
         reasons = []
         
         # 1. Check embedding similarity
-        if summary1['embedding'] is not None and summary2['embedding'] is not None:
-            similarity = self._cosine_similarity(summary1['embedding'], summary2['embedding'])
+        if similarity is None and summary1['embedding'] is not None and summary2['embedding'] is not None:
+            similarity = float(cosine_similarity_matrix(summary1['embedding'], summary2['embedding'])[0, 0])
+        if similarity is not None and not np.isnan(similarity):
             if similarity > 0.85:
                 score += 0.3
                 reasons.append(f"High semantic similarity: {similarity:.2f}")
@@ -263,14 +364,16 @@ Return a detailed JSON object:
             reasons.append(f"Common participants: {', '.join(common_participants)}")
         
         # 3. Check if one thread answers questions from another
-        for q in summary1['questions']:
-            for email in group2:
-                answers = email.metadata.get('answers_provided', [])
-                for a in answers:
-                    if self._matches_question_answer(q, a.get('answers_question', '')):
-                        score += 0.4
-                        reasons.append(f"Thread 2 answers question from Thread 1")
-                        break
+        answer_refs = [[a.get('answers_question', '') for a in email.metadata.get('answers_provided', [])]
+                       for email in group2]
+        matches = self.answer_matcher.match_matrix(summary1['questions'], [ref for refs in answer_refs for ref in refs])
+        for row in matches:
+            offset = 0
+            for refs in answer_refs:
+                if row[offset:offset + len(refs)].any():
+                    score += 0.4
+                    reasons.append(f"Thread 2 answers question from Thread 1")
+                offset += len(refs)
         
         # 4. Check for forwarded content
         for email in group2:
@@ -303,26 +406,6 @@ Return a detailed JSON object:
             'reasons': reasons
         }
     
-    def _matches_question_answer(self, question: str, answer_ref: str) -> bool:
-        """Check if an answer references a specific question"""
-        if not question or not answer_ref:
-            return False
-        
-        # Simple check first
-        if question.lower() in answer_ref.lower() or answer_ref.lower() in question.lower():
-            return True
-        
-        # Use LLM for semantic matching
-        prompt = f"""Does this answer reference match this question? Answer YES or NO.
-Question: {question}
-Answer reference: {answer_ref}"""
-        
-        try:
-            response = self.llm.generate(prompt, temperature=0.1)
-            return 'YES' in response.upper()
-        except:
-            return False
-    
     def _verify_connection_with_llm(self, group1_sample: List[Email], group2_sample: List[Email]) -> bool:
         """Use LLM to verify if two groups are connected"""
         
@@ -379,10 +462,13 @@ Answer YES if they are clearly connected, NO if they are separate topics."""
         
         return merged_groups
     
-    def _analyze_daily_responses_enhanced(self, emails: List[Email]) -> Dict[str, Any]:
+    def _analyze_daily_responses_enhanced(self, emails: List[Email],
+                                          answer_index: Optional[AnswerIndex] = None) -> Dict[str, Any]:
         """Enhanced daily response analysis that tracks same-day responses"""
         
+        answer_index = answer_index or self.response_tracker.build_answer_index(emails)
         daily_status = {}
+        first_answers = {}  # day -> first answer after each of its questions, if any
         sorted_emails = sorted(emails, key=lambda x: x.date)
         
         # Group emails by day
@@ -399,35 +485,22 @@ Answer YES if they are clearly connected, NO if they are separate topics."""
             
             # Track all questions asked this day
             questions_asked_today = []
+            first_answers[day] = []
             for email in day_emails:
-                for q in email.metadata.get('questions_asked', []):
-                    if q.get('needs_answer'):
-                        questions_asked_today.append({
-                            'question': q['question'],
-                            'asked_by': email.from_email,
-                            'asked_at': email.date,
-                            'email_subject': email.subject,
-                            'answered_same_day': False,
-                            'answered_by': None,
-                            'answered_at': None
-                        })
-            
-            # Check for same-day responses
-            for question in questions_asked_today:
-                for email in day_emails:
-                    # Only check emails after the question was asked
-                    if email.date > question['asked_at']:
-                        for answer in email.metadata.get('answers_provided', []):
-                            if self._matches_question_answer(
-                                question['question'], 
-                                answer.get('answers_question', '')
-                            ):
-                                question['answered_same_day'] = True
-                                question['answered_by'] = email.from_email
-                                question['answered_at'] = email.date
-                                break
-                    if question['answered_same_day']:
-                        break
+                for question, q in answer_index.questions_of(email):
+                    # Only emails after the question was asked count as responses
+                    first = answer_index.first_answer(question, after=email.date)
+                    answered_same_day = bool(first) and first[0].date.date() == day
+                    questions_asked_today.append({
+                        'question': q['question'],
+                        'asked_by': email.from_email,
+                        'asked_at': email.date,
+                        'email_subject': email.subject,
+                        'answered_same_day': answered_same_day,
+                        'answered_by': first[0].from_email if answered_same_day else None,
+                        'answered_at': first[0].date if answered_same_day else None
+                    })
+                    first_answers[day].append(first)
             
             # Calculate response times for this day
             response_times = []
@@ -456,34 +529,17 @@ Answer YES if they are clearly connected, NO if they are separate topics."""
         for day_key, status in daily_status.items():
             day_date = date.fromisoformat(day_key)
             if day_date < today:  # Don't include today's questions
-                for q in status['questions_asked']:
-                    if not q['answered_same_day']:
-                        # Check if it was answered on any later day
-                        answered_later = False
-                        for later_day, later_emails in emails_by_day.items():
-                            if later_day > day_date:
-                                for email in later_emails:
-                                    for answer in email.metadata.get('answers_provided', []):
-                                        if self._matches_question_answer(
-                                            q['question'],
-                                            answer.get('answers_question', '')
-                                        ):
-                                            answered_later = True
-                                            break
-                                    if answered_later:
-                                        break
-                            if answered_later:
-                                break
-                        
-                        if not answered_later:
-                            days_waiting = (today - day_date).days
-                            unanswered_today.append({
-                                'question': q['question'],
-                                'asked_by': q['asked_by'],
-                                'asked_on': day_key,
-                                'days_waiting': days_waiting,
-                                'critical': days_waiting > config.CRITICAL_DAYS_WITHOUT_RESPONSE
-                            })
+                for first, q in zip(first_answers[day_date], status['questions_asked']):
+                    # Still open if nothing answered it that day or on any later day
+                    if first is None:
+                        days_waiting = (today - day_date).days
+                        unanswered_today.append({
+                            'question': q['question'],
+                            'asked_by': q['asked_by'],
+                            'asked_on': day_key,
+                            'days_waiting': days_waiting,
+                            'critical': days_waiting > config.CRITICAL_DAYS_WITHOUT_RESPONSE
+                        })
         
         # Calculate response time patterns by day
         response_times_by_day = {}
@@ -538,21 +594,117 @@ Answer YES if they are clearly connected, NO if they are separate topics."""
         
         return referenced
     
-    def _cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
-        """Calculate cosine similarity between two vectors"""
-        try:
-            dot_product = np.dot(vec1, vec2)
-            norm1 = np.linalg.norm(vec1)
-            norm2 = np.linalg.norm(vec2)
+    def _normalized_centroids(self, summaries: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Unit-length thread centroids as one matrix, plus a mask of threads that have one"""
+        has_embedding = np.array([summary['embedding'] is not None for summary in summaries], dtype=bool)
+        dimensions = {len(summary['embedding']) for summary in summaries if summary['embedding'] is not None}
+        if len(dimensions) != 1:
+            has_embedding[:] = False
+            return np.zeros((len(summaries), 0), dtype=np.float32), has_embedding
             
-            if norm1 == 0 or norm2 == 0:
-                return 0.0
-                
-            return float(dot_product / (norm1 * norm2))
-        except Exception:
-            return 0.0
-        
-    def _create_thread_with_response_tracking(self, emails: List[Email]) -> Optional[Thread]:
+        centroids = np.zeros((len(summaries), dimensions.pop()), dtype=np.float32)
+        for i in np.flatnonzero(has_embedding):
+            centroids[i] = summaries[i]['embedding']
+        return normalize_rows(centroids), has_embedding
+        
+    def _candidate_pairs(self, thread_groups: List[List[Email]], summaries: List[Dict[str, Any]],
+                         centroids: np.ndarray, has_embedding: np.ndarray) -> Set[Tuple[int, int]]:
+        """Thread pairs worth scoring: embedding neighbours, shared participants/terms, subject links"""
+        pairs = self._embedding_neighbor_pairs(centroids, has_embedding)
+        
+        # Connection scoring needs 2+ shared participants or 4+ shared key terms
+        pairs |= self._shared_posting_pairs([summary['participants'] for summary in summaries], 2)
+        pairs |= self._shared_posting_pairs([summary['key_terms'] for summary in summaries], 4)
+        
+        # Subject blocking: same normalized subject, reply-to subject or ticket identifier
+        keys = []
+        for group in thread_groups:
+            group_keys = set()
+            for email in group:
+                group_keys.update(subject_keys(email.subject, email.metadata.get('is_reply_to_subject')))
+                group_keys.update(re.findall(r'[A-Z]+-\d+', email.subject or ''))
+            keys.append(group_keys)
+        pairs |= self._shared_posting_pairs(keys, 1)
+        
+        pairs |= self._subject_reference_pairs(thread_groups, summaries)
+        return pairs
+        
+    def _embedding_neighbor_pairs(self, centroids: np.ndarray, has_embedding: np.ndarray,
+                                  chunk_size: int = 1024) -> Set[Tuple[int, int]]:
+        """k nearest thread centroids per thread, computed in row chunks to bound memory"""
+        pairs = set()
+        rows = np.flatnonzero(has_embedding)
+        if len(rows) < 2:
+            return pairs
+            
+        matrix = centroids[rows]
+        k = min(config.THREAD_CANDIDATE_NEIGHBORS + 1, len(rows))
+        for start in range(0, len(rows), chunk_size):
+            scores = matrix[start:start + chunk_size] @ matrix.T
+            for offset, neighbours in enumerate(top_k(scores, k)):
+                i = int(rows[start + offset])
+                for j in rows[neighbours].tolist():
+                    if i != j:
+                        pairs.add((min(i, j), max(i, j)))
+        return pairs
+        
+    def _shared_posting_pairs(self, features: List[Any], min_shared: int) -> Set[Tuple[int, int]]:
+        """Pairs sharing at least min_shared features, via an inverted index over the features"""
+        postings = {}
+        for i, values in enumerate(features):
+            for value in set(values):
+                if value:
+                    postings.setdefault(value, []).append(i)
+        
+        shared = {}
+        for posting in postings.values():
+            # Features common to most threads (e.g. the mailbox owner) carry no signal and would make this quadratic
+            if len(posting) > config.THREAD_CANDIDATE_MAX_POSTING:
+                continue
+            for a in range(len(posting)):
+                for b in range(a + 1, len(posting)):
+                    pair = (posting[a], posting[b])
+                    shared[pair] = shared.get(pair, 0) + 1
+                    
+        return {pair for pair, count in shared.items() if count >= min_shared}
+        
+    def _subject_reference_pairs(self, thread_groups: List[List[Email]],
+                                 summaries: List[Dict[str, Any]]) -> Set[Tuple[int, int]]:
+        """Pairs where an email body or reply-to subject may quote another thread's subject, matched on leading subject words"""
+        prefix_words = 3
+        threads_by_prefix = {}
+        for i, summary in enumerate(summaries):
+            for subject in summary['subjects']:
+                words = tuple(re.findall(r'\w+', (subject or '').lower())[:prefix_words])
+                if words:
+                    threads_by_prefix.setdefault(words, set()).add(i)
+        
+        referenced_by = {}
+        for j, group in enumerate(thread_groups):
+            for email in group:
+                text = f"{email.body or ''} {email.metadata.get('is_reply_to_subject') or ''}"
+                words = re.findall(r'\w+', text.lower())
+                for length in range(1, prefix_words + 1):
+                    for start in range(len(words) - length + 1):
+                        prefix = tuple(words[start:start + length])
+                        if prefix in threads_by_prefix:
+                            referenced_by.setdefault(prefix, set()).add(j)
+        
+        pairs = set()
+        for prefix, referencing in referenced_by.items():
+            subjects = threads_by_prefix[prefix]
+            # Short subjects like "Update" appear in most bodies; same posting cap as _shared_posting_pairs
+            if (len(subjects) > config.THREAD_CANDIDATE_MAX_POSTING or
+                    len(referencing) > config.THREAD_CANDIDATE_MAX_POSTING):
+                continue
+            for i in subjects:
+                for j in referencing:
+                    if i != j:
+                        pairs.add((min(i, j), max(i, j)))
+        return pairs
+        
+    def _create_thread_with_response_tracking(self, emails: List[Email],
+                                              answer_index: Optional[AnswerIndex] = None) -> Optional[Thread]:
         if not emails:
             return None
             
@@ -563,7 +715,7 @@ Answer YES if they are clearly connected, NO if they are separate topics."""
         valid_emails.sort(key=lambda x: x.date)
         
         # Analyze response chains with enhanced tracking
-        response_analysis = self.response_tracker.analyze_response_chains(valid_emails)
+        response_analysis = self.response_tracker.analyze_response_chains(valid_emails, answer_index)
         conversation_flows = self.response_tracker.find_conversation_flows(valid_emails)
         
         # Identify thread continuations in other subjects
@@ -637,8 +789,13 @@ Answer YES if they are clearly connected, NO if they are separate topics."""
             'average_response_time_days': response_analysis.get('average_response_time_days'),
             'questions_answered_ratio': response_analysis['answered_count'] / response_analysis['total_questions'] if response_analysis['total_questions'] > 0 else 1.0,
             'thread_continuations': thread_continuations,
+            # Precomputed for continuation lookups between threads
+            'continuation_keys': sorted({normalize_subject(c['original_subject']) for c in thread_continuations
+                                         if c.get('original_subject')} - {''}),
             'response_pattern': self._analyze_response_pattern(valid_emails),
-            'escalation_needed': days_since_activity > 5 and len(unresolved_questions) > 0
+            'escalation_needed': days_since_activity > 5 and len(unresolved_questions) > 0,
+            'subject_keys': sorted({key for email in valid_emails
+                                    for key in subject_keys(email.subject, email.metadata.get('is_reply_to_subject'))})
         }
         
         return Thread(
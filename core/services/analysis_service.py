@@ -6,9 +6,17 @@ from core.interfaces.validator import ValidatorInterface
 from core.processors.thread_analyzer import ThreadAnalyzer
 from core.processors.priority_calculator import PriorityCalculator
 from core.models.email import Email
+from core.models.thread import Thread
+from core.models.priority import Priority
+from core.utils.bulk_writer import BulkWriter
 from core.utils.logger import get_logger
-from datetime import datetime
+from core.utils.subjects import subject_keys
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, date
 from tqdm import tqdm
+import numpy as np
 import config
 
 class AnalysisService:
@@ -22,27 +30,22 @@ class AnalysisService:
         self.priority_calculator = PriorityCalculator(llm, validator)
         self.logger = get_logger(__name__)
         
-    def analyze_portfolio(self):
+    def analyze_portfolio(self, incremental: bool = False):
+        if incremental:
+            return self._analyze_incremental()
+            
         print("\n=== Portfolio Analysis Started ===\n")
         
         # Clear existing analysis data
         print("Clearing previous analysis data...")
         self.storage.db[config.THREADS_COLLECTION].delete_many({})
         self.storage.db[config.PRIORITIES_COLLECTION].delete_many({})
+        self.storage.db[config.PENDING_QUESTIONS_COLLECTION].delete_many({})
+        self._ensure_indexes()
         
         # Step 1: Load emails
         print("\nStep 1: Loading emails from database...")
-        email_docs = list(self.storage.find(config.EMAILS_COLLECTION, {}))
-        emails = []
-        
-        with tqdm(total=len(email_docs), desc="Converting emails", unit="email") as pbar:
-            for doc in email_docs:
-                email = self._doc_to_email(doc)
-                if email and email.from_email and email.date:
-                    emails.append(email)
-                pbar.update(1)
-        
-        print(f"Loaded {len(emails)} valid emails from {len(email_docs)} total documents")
+        emails = self._load_emails({})
         
         if not emails:
             print("ERROR: No valid emails found for analysis")
@@ -55,49 +58,273 @@ class AnalysisService:
         
         # Step 3: Calculate priorities and save
         print(f"\nStep 3: Calculating priorities for each thread...")
+        high_priority_count = self._save_threads_with_priorities(threads)
         
-        high_priority_count = 0
+        # Summary
+        self._stamp_dataset_version()
         
-        with tqdm(total=len(threads), desc="Processing threads", unit="thread") as pbar:
-            for i, thread in enumerate(threads):
-                pbar.set_description(f"Thread {i+1}/{len(threads)}: {thread.subject[:30]}...")
-                
-                # Save thread
-                thread_doc = thread.to_dict()
-                thread_id = self.storage.insert_one(config.THREADS_COLLECTION, thread_doc)
+        print(f"\n=== Analysis Complete ===")
+        print(f"Total threads analyzed: {len(threads)}")
+        print(f"High priority items: {high_priority_count}")
+        print(f"Priority threshold: {config.PRIORITY_THRESHOLD}")
+        self._print_token_usage()
+        
+        # Top issues summary
+        self._print_top_issues()
+        
+    def _analyze_incremental(self):
+        """Thread new emails into existing threads and only recompute the threads that changed"""
+        print("\n=== Incremental Portfolio Analysis Started ===\n")
+        self._ensure_indexes()
+        
+        # Step 1: Emails no analysis run has threaded yet
+        print("Step 1: Loading new emails...")
+        new_emails = self._load_emails({'thread_id': None})
+        
+        # Threads whose emails were removed or replaced by re-ingestion are dirty as well
+        threaded_ids = {str(doc['_id']) for doc in self.storage.db[config.EMAILS_COLLECTION].find(
+            {'thread_id': {'$ne': None}}, {'_id': 1})}
+        thread_email_ids = {}
+        dirty_thread_ids = set()
+        for doc in self.storage.db[config.THREADS_COLLECTION].find({}, {'email_ids': 1}):
+            email_ids = set(doc.get('email_ids', []))
+            thread_email_ids[str(doc['_id'])] = email_ids & threaded_ids
+            if not email_ids <= threaded_ids:
+                dirty_thread_ids.add(str(doc['_id']))
+        
+        # Step 2: Attach new emails to existing threads, group the rest into new ones
+        print("\nStep 2: Assigning new emails to threads...")
+        assignments = self._assign_to_existing_threads(new_emails)
+        for email_id, thread_id in assignments.items():
+            thread_email_ids.setdefault(thread_id, set()).add(email_id)
+            dirty_thread_ids.add(thread_id)
+            
+        unassigned = [email for email in new_emails if email.id not in assignments]
+        new_groups = self.thread_analyzer.group_emails(unassigned) if unassigned else []
+        print(f"{len(assignments)} emails joined existing threads, {len(unassigned)} formed {len(new_groups)} new threads")
+        
+        # Step 3: Rebuild dirty threads from their full email set
+        print(f"\nStep 3: Rebuilding {len(dirty_thread_ids)} changed threads...")
+        threads = []
+        for thread_id in sorted(dirty_thread_ids):
+            email_ids = thread_email_ids.get(thread_id, set())
+            # Building a thread doesn't look at embeddings, so they stay in the database
+            thread_emails = self._load_emails({'_id': {'$in': [ObjectId(i) for i in email_ids]}},
+                                              quiet=True, embeddings=False) if email_ids else []
+            thread = self.thread_analyzer.build_thread(thread_emails)
+            if thread:
                 thread.id = thread_id
+                threads.append(thread)
+            else:
+                self.storage.delete_one(config.THREADS_COLLECTION, {'_id': ObjectId(thread_id)})
+                self.storage.db[config.PRIORITIES_COLLECTION].delete_many({'thread_id': thread_id})
+                self.storage.db[config.PENDING_QUESTIONS_COLLECTION].delete_many({'thread_id': thread_id})
                 
-                try:
-                    # Calculate priority
-                    priority = self.priority_calculator.calculate_priorities(thread)
-                    priority_doc = priority.to_dict()
-                    self.storage.insert_one(config.PRIORITIES_COLLECTION, priority_doc)
+        for group in new_groups:
+            thread = self.thread_analyzer.build_thread(group)
+            if thread:
+                threads.append(thread)
+        
+        # Step 4: Re-score only those threads; untouched priorities stay as they are
+        print(f"\nStep 4: Calculating priorities for {len(threads)} threads...")
+        high_priority_count = self._save_threads_with_priorities(threads)
+        
+        self._stamp_dataset_version()
+        
+        print(f"\n=== Incremental Analysis Complete ===")
+        print(f"New emails: {len(new_emails)}")
+        print(f"Threads recomputed: {len(threads)}")
+        print(f"High priority items among them: {high_priority_count}")
+        self._print_token_usage()
+        
+        self._print_top_issues()
+        
+    def _assign_to_existing_threads(self, emails: List[Email]) -> Dict[str, str]:
+        """Map new email ids to existing thread ids via reply subjects, then embedding neighbours"""
+        assignments = {}
+        
+        keys_by_email = {email.id: subject_keys(email.subject, email.metadata.get('is_reply_to_subject')) for email in emails}
+        all_keys = sorted({key for keys in keys_by_email.values() for key in keys})
+        thread_by_key = {}
+        if all_keys:
+            for doc in self.storage.db[config.THREADS_COLLECTION].find(
+                    {'metadata.subject_keys': {'$in': all_keys}}, {'metadata.subject_keys': 1}):
+                for key in doc.get('metadata', {}).get('subject_keys', []):
+                    thread_by_key.setdefault(key, str(doc['_id']))
                     
-                    if priority.score > config.PRIORITY_THRESHOLD:
-                        high_priority_count += 1
+        for email in emails:
+            for key in keys_by_email[email.id]:
+                if key in thread_by_key:
+                    assignments[email.id] = thread_by_key[key]
+                    break
+        
+        # Semantic fallback: join the thread of a very similar, already threaded email
+        remaining = [email for email in emails
+                     if email.id not in assignments and email.embedding is not None and len(email.embedding)]
+        if remaining:
+            results = self.vector_store.search_similar_batch(
+                config.EMAILS_COLLECTION, [email.embedding for email in remaining], k=5
+            )
+            for email, hits in zip(remaining, results):
+                for doc, score in hits:
+                    if score < config.THREAD_SIMILARITY_THRESHOLD:
+                        break
+                    if doc.get('thread_id') and str(doc['_id']) != email.id:
+                        assignments[email.id] = str(doc['thread_id'])
+                        break
                         
+        return assignments
+        
+    def _save_threads_with_priorities(self, threads: List[Thread]) -> int:
+        """Store threads in order, assess them concurrently, validate as one batch, then store priorities in order"""
+        with self.storage.bulk_writer(config.THREADS_COLLECTION) as thread_writer, \
+             self.storage.bulk_writer(config.EMAILS_COLLECTION) as email_writer:
+            for thread in threads:
+                self._save_thread(thread, thread_writer, email_writer)
+        self._save_pending_questions(threads)
+            
+        priorities: List[Optional[Priority]] = [None] * len(threads)
+        with tqdm(total=len(threads), desc="Scoring threads", unit="thread") as pbar, \
+             ThreadPoolExecutor(max_workers=config.ANALYSIS_CONCURRENCY) as pool:
+            futures = {pool.submit(self.priority_calculator.assess_thread, thread): i
+                       for i, thread in enumerate(threads)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    priorities[i] = future.result()
                 except Exception as e:
-                    self.logger.error(f"Error calculating priority for thread {thread_id}: {str(e)}")
+                    self.logger.error(f"Error calculating priority for thread {threads[i].id}: {str(e)}")
+                pbar.set_postfix_str(f"Last: {threads[i].subject[:30]}")
+                pbar.update(1)
+        
+        # One validation batch for the whole run instead of one request per thread and round
+        assessed = [priority for priority in priorities if priority is not None]
+        print(f"Validating {len(assessed)} priority assessments...")
+        try:
+            self.priority_calculator.validate_priorities(assessed)
+        except Exception as e:
+            self.logger.error(f"Error validating priority assessments: {str(e)}")
+        
+        high_priority_count = 0
+        with self.storage.bulk_writer(config.PRIORITIES_COLLECTION) as priority_writer:
+            for thread, priority in zip(threads, priorities):
+                if priority is None:
+                    continue
+                priority_writer.upsert({'thread_id': thread.id}, priority.to_dict())
+                if priority.score > config.PRIORITY_THRESHOLD:
+                    high_priority_count += 1
+                
+        return high_priority_count
+        
+    def _save_thread(self, thread: Thread, thread_writer: BulkWriter, email_writer: BulkWriter):
+        """Queue an upsert of the thread and stamp its emails with the thread id"""
+        # Ids are assigned client-side so priorities can reference threads before the writes are flushed
+        if not thread.id:
+            thread.id = str(ObjectId())
+        thread_writer.upsert({'_id': ObjectId(thread.id)}, thread.to_dict())
+        email_writer.update(
+            {'_id': {'$in': [ObjectId(email_id) for email_id in thread.email_ids]}},
+            {'thread_id': thread.id},
+            many=True
+        )
+        
+    def _save_pending_questions(self, threads: List[Thread]):
+        """Materialize one row per open question so /api/todays-pending is a single indexed query"""
+        thread_ids = [thread.id for thread in threads if thread.id]
+        if thread_ids:
+            self.storage.db[config.PENDING_QUESTIONS_COLLECTION].delete_many({'thread_id': {'$in': thread_ids}})
+            
+        today_key = date.today().isoformat()
+        with self.storage.bulk_writer(config.PENDING_QUESTIONS_COLLECTION) as writer:
+            for thread in threads:
+                base = {'thread_id': thread.id, 'thread_subject': thread.subject}
+                
+                # Asked today and not answered yet
+                today = thread.metadata.get('daily_response_status', {}).get(today_key, {})
+                for q in today.get('questions_asked', []):
+                    if not q.get('answered_same_day'):
+                        writer.insert(dict(base, day=today_key, question=q['question'], asker=q['asked_by'],
+                                           asked_at=q.get('asked_at', ''), email_subject=q.get('email_subject', ''),
+                                           days_waiting=0, critical=False))
                 
+                # Asked on an earlier day and still unanswered
+                for q in thread.metadata.get('unanswered_today', []):
+                    writer.insert(dict(base, day=q['asked_on'], question=q['question'], asker=q['asked_by'],
+                                       days_waiting=q['days_waiting'], critical=q.get('critical', False)))
+        
+    def _stamp_dataset_version(self):
+        """Record that analysis output changed; read endpoints key their response caches on this"""
+        self.storage.db[config.DATASET_METADATA_COLLECTION].update_one(
+            {'_id': 'dataset'},
+            {'$set': {'version': str(ObjectId()), 'updated_at': datetime.utcnow().replace(microsecond=0)}},
+            upsert=True
+        )
+        
+    def _ensure_indexes(self):
+        self.storage.db[config.PRIORITIES_COLLECTION].create_index([('score', DESCENDING)])
+        self.storage.db[config.EMAILS_COLLECTION].create_index('thread_id')
+        self.storage.db[config.THREADS_COLLECTION].create_index('metadata.subject_keys')
+        self.storage.db[config.THREADS_COLLECTION].create_index('participants')
+        self.storage.db[config.PRIORITIES_COLLECTION].create_index('thread_id')
+        pending = self.storage.db[config.PENDING_QUESTIONS_COLLECTION]
+        pending.create_index([('day', ASCENDING), ('critical', ASCENDING)])
+        pending.create_index([('days_waiting', DESCENDING)])
+        pending.create_index('thread_id')
+        
+    def _load_emails(self, query: Dict[str, Any], quiet: bool = False, embeddings: bool = True) -> List[Email]:
+        """Stream emails without their embeddings; with embeddings=True attach them as rows of one float32 block"""
+        total = self.storage.db[config.EMAILS_COLLECTION].count_documents(query)
+        emails = []
+        
+        with tqdm(total=total, desc="Converting emails", unit="email", disable=quiet) as pbar:
+            for doc in self.storage.find_iter(config.EMAILS_COLLECTION, query, projection={'embedding': 0}):
+                email = self._doc_to_email(doc)
+                if email and email.from_email and email.date:
+                    emails.append(email)
                 pbar.update(1)
         
-        # Summary
-        print(f"\n=== Analysis Complete ===")
-        print(f"Total threads analyzed: {len(threads)}")
-        print(f"High priority items: {high_priority_count}")
-        print(f"Priority threshold: {config.PRIORITY_THRESHOLD}")
+        if embeddings:
+            self._attach_embeddings(emails, query)
+        if not quiet:
+            print(f"Loaded {len(emails)} valid emails from {total} total documents")
+        return emails
         
-        # Top issues summary
-        self._print_top_issues()
+    def _attach_embeddings(self, emails: List[Email], query: Dict[str, Any]):
+        """Second streaming pass over the embeddings only; each email gets a view into the shared block"""
+        rows = {email.id: i for i, email in enumerate(emails)}
+        block = np.zeros((len(emails), config.EMBEDDING_DIMENSIONS), dtype=np.float32)
+        present = np.zeros(len(emails), dtype=bool)
+        
+        has_embedding = {'embedding': {'$exists': True, '$ne': []}}
+        embedding_query = {'$and': [query, has_embedding]} if query else has_embedding
+        for doc in self.storage.find_iter(config.EMAILS_COLLECTION, embedding_query, projection={'embedding': 1}):
+            i = rows.get(str(doc['_id']))
+            if i is not None and len(doc['embedding']) == config.EMBEDDING_DIMENSIONS:
+                block[i] = doc['embedding']
+                present[i] = True
+                
+        for i, email in enumerate(emails):
+            email.embedding = block[i] if present[i] else None
         
+    def _print_token_usage(self):
+        for mode, usage in sorted(self.priority_calculator.token_usage.items()):
+            tokens = usage['prompt_tokens'] + usage['completion_tokens']
+            per_thread = tokens / usage['threads'] if usage['threads'] else 0
+            print(f"Priority assessment ({mode}): {usage['threads']} threads, {usage['calls']} LLM calls, "
+                  f"~{tokens} tokens (~{per_thread:.0f} per thread)")
+        if self.priority_calculator.fused_fallbacks:
+            print(f"Fused assessments that fell back to separate calls: {self.priority_calculator.fused_fallbacks}")
+            
     def _print_top_issues(self):
         print("\n=== Top Priority Issues ===")
         
-        priorities = list(self.storage.find(config.PRIORITIES_COLLECTION, {}))
-        priorities.sort(key=lambda x: x.get('score', 0), reverse=True)
+        priorities = list(self.storage.db[config.PRIORITIES_COLLECTION].find({}).sort('score', DESCENDING).limit(5))
+        thread_ids = [ObjectId(p['thread_id']) for p in priorities if p.get('thread_id')]
+        threads = {str(t['_id']): t for t in self.storage.db[config.THREADS_COLLECTION].find(
+            {'_id': {'$in': thread_ids}}, {'subject': 1})}
         
-        for i, priority in enumerate(priorities[:5]):
-            thread = self.storage.find_one(config.THREADS_COLLECTION, {'_id': priority.get('thread_id')})
+        for i, priority in enumerate(priorities):
+            thread = threads.get(str(priority.get('thread_id')))
             if thread:
                 print(f"\n{i+1}. {thread.get('subject', 'Unknown')}")
                 print(f"   Priority Score: {priority.get('score', 0):.2f}")
@@ -130,7 +357,8 @@ class AnalysisService:
                 thread_id=doc.get('thread_id'),
                 is_internal=doc.get('is_internal', True),
                 embedding=doc.get('embedding'),
-                metadata=doc.get('metadata', {})
+                metadata=doc.get('metadata', {}),
+                source_file=doc.get('source_file')
             )
         except Exception as e:
             self.logger.error(f"Error converting document to email: {str(e)}")
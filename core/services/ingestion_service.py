@@ -1,68 +1,306 @@
-from typing import List
+from typing import List, Dict, Any, Optional, Tuple, Set
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+import threading
+import hashlib
 import os
-from core.processors.email_parser import EmailParser
+from bson import ObjectId
+from core.processors.email_parser import EmailParser, PartialParseError
 from core.interfaces.storage import StorageInterface
 from core.interfaces.llm import LLMInterface
+from core.interfaces.vector_store import VectorStoreInterface
+from core.models.email import Email
 import config
+from core.utils.embedding_cache import EmbeddingCache
 from core.utils.logger import get_logger
 from tqdm import tqdm
 
+_DONE = object()  # End-of-stream marker passed between pipeline stages
+
 class IngestionService:
-    def __init__(self, storage: StorageInterface, llm: LLMInterface):
+    def __init__(self, storage: StorageInterface, llm: LLMInterface,
+                 vector_store: Optional[VectorStoreInterface] = None,
+                 concurrency: Optional[int] = None):
         self.storage = storage
         self.llm = llm
+        self.vector_store = vector_store
+        self.concurrency = concurrency or config.INGESTION_CONCURRENCY
         self.parser = EmailParser(llm=llm)  # Pass LLM to parser
+        self.embedding_cache = (EmbeddingCache(config.EMBEDDING_CACHE_PATH, config.EMBEDDING_MODEL)
+                                if config.EMBEDDING_CACHE_ENABLED else None)
         self.logger = get_logger(__name__)
-        
-    def ingest_all_emails(self):
+
+    def ingest_all_emails(self, incremental: bool = False):
         print("\n=== Email Ingestion Started ===\n")
-        
-        print("Clearing existing email data...")
-        self.storage.db[config.EMAILS_COLLECTION].delete_many({})
-        
-        email_files = [f for f in os.listdir(config.EMAILS_DIR) if f.endswith('.txt')]
-        print(f"Found {len(email_files)} email files to process\n")
-        
-        total_emails = 0
-        
+
+        email_files = sorted(f for f in os.listdir(config.EMAILS_DIR) if f.endswith('.txt'))
+        file_stats = {file: self._file_stat(file) for file in email_files}
+
+        if incremental:
+            email_files = self._plan_incremental(file_stats)
+        else:
+            print("Clearing existing email data...")
+            self.storage.db[config.EMAILS_COLLECTION].delete_many({})
+            self.storage.db[config.MANIFEST_COLLECTION].delete_many({})
+            if self.vector_store:
+                self.vector_store.invalidate_index(config.EMAILS_COLLECTION)
+
+        print(f"Found {len(email_files)} email files to process")
+        print(f"Pipeline: {self.concurrency} parse workers, {self.concurrency} batched embedding requests, "
+              f"bulk writes of {config.INGESTION_WRITE_BATCH_SIZE}\n")
+
+        # parse workers -> parsed -> embedding stage -> embedded -> bulk writer (this thread)
+        pending_files = Queue()
+        for file in email_files:
+            pending_files.put(file)
+        parsed = Queue(maxsize=config.INGESTION_QUEUE_SIZE)
+        embedded = Queue(maxsize=config.INGESTION_QUEUE_SIZE)
+        incomplete_files: Set[str] = set()  # Partly parsed; kept out of the manifest so the next run retries them
+
+        parse_workers = [
+            threading.Thread(target=self._parse_stage,
+                             args=(pending_files, parsed, file_stats, incomplete_files, incremental), daemon=True)
+            for _ in range(min(self.concurrency, max(len(email_files), 1)))
+        ]
+        embedding_worker = threading.Thread(
+            target=self._embedding_stage, args=(parsed, embedded, len(parse_workers)), daemon=True
+        )
+        for worker in parse_workers + [embedding_worker]:
+            worker.start()
+
         with tqdm(total=len(email_files), desc="Processing files", unit="file") as file_pbar:
-            for file in email_files:
+            total_emails = self._write_stage(embedded, file_pbar, file_stats, incomplete_files, incremental)
+
+        for worker in parse_workers + [embedding_worker]:
+            worker.join()
+
+        if self.vector_store:
+            if incremental:
+                self.vector_store.persist_index(config.EMAILS_COLLECTION)
+            else:
+                print("\nBuilding vector index...")
+                self.vector_store.create_index(config.EMAILS_COLLECTION, 'embedding', config.EMBEDDING_DIMENSIONS)
+
+        print(f"\n=== Ingestion Complete ===")
+        print(f"Total emails ingested: {total_emails}")
+        print(f"Files processed: {len(email_files)}")
+        if self.embedding_cache:
+            print(f"Embedding cache: {self.embedding_cache.hits} reused, {self.embedding_cache.misses} generated "
+                  f"({self.embedding_cache.hit_rate:.0%} hit rate)")
+
+        return total_emails
+
+    def _plan_incremental(self, file_stats: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Compare files on disk with the manifest; drop emails of deleted files and return new/changed ones"""
+        manifest = {entry['path']: entry for entry in self.storage.find(config.MANIFEST_COLLECTION, {})}
+
+        new_files, changed_files, unchanged = [], [], 0
+        manifest_writer = self.storage.bulk_writer(config.MANIFEST_COLLECTION)
+        for file, stat in file_stats.items():
+            entry = manifest.get(file)
+            if entry is None:
+                new_files.append(file)
+            elif entry.get('size') == stat['size'] and entry.get('mtime') == stat['mtime']:
+                unchanged += 1
+            elif entry.get('sha256') == self._file_hash(file):
+                # Touched but identical content; just remember the new mtime
+                manifest_writer.update({'path': file}, {'mtime': stat['mtime']})
+                unchanged += 1
+            else:
+                changed_files.append(file)
+        manifest_writer.close()
+
+        deleted_files = [file for file in manifest if file not in file_stats]
+        if deleted_files:
+            self._remove_file_emails(deleted_files)
+            self.storage.db[config.MANIFEST_COLLECTION].delete_many({'path': {'$in': deleted_files}})
+
+        print(f"Incremental ingestion: {len(new_files)} new, {len(changed_files)} changed, "
+              f"{len(deleted_files)} removed, {unchanged} unchanged files")
+        return new_files + changed_files
+
+    def _file_stat(self, file: str) -> Dict[str, Any]:
+        stat = os.stat(os.path.join(config.EMAILS_DIR, file))
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def _file_hash(self, file: str) -> str:
+        digest = hashlib.sha256()
+        with open(os.path.join(config.EMAILS_DIR, file), 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _remove_file_emails(self, files: List[str], keep_ids: Optional[List[str]] = None):
+        """Delete the emails previously ingested from these files, including their index vectors"""
+        query = {'source_file': {'$in': files}}
+        if keep_ids:
+            query['_id'] = {'$nin': [ObjectId(email_id) for email_id in keep_ids]}
+        if self.vector_store:
+            old_ids = [str(doc['_id']) for doc in self.storage.db[config.EMAILS_COLLECTION].find(query, {'_id': 1})]
+            self.vector_store.remove_vectors(config.EMAILS_COLLECTION, old_ids)
+        self.storage.db[config.EMAILS_COLLECTION].delete_many(query)
+
+    def _parse_stage(self, pending_files: Queue, parsed: Queue, file_stats: Dict[str, Dict[str, Any]],
+                     incomplete_files: Set[str], incremental: bool):
+        """Parse files until none are left; put() blocks while downstream stages catch up"""
+        try:
+            while True:
+                try:
+                    file = pending_files.get_nowait()
+                except Empty:
+                    break
+
                 filepath = os.path.join(config.EMAILS_DIR, file)
-                
                 try:
-                    file_pbar.set_postfix_str(f"Parsing {file} with LLM...")
-                    emails = self.parser.parse_email_file(filepath)
-                    file_pbar.set_postfix_str(f"Current: {file} ({len(emails)} emails)")
-                    
-                    if emails:
-                        with tqdm(total=len(emails), desc=f"  Emails from {file}", leave=False, unit="email") as email_pbar:
-                            for email in emails:
-                                try:
-                                    email_text = f"{email.subject} {email.body}"
-                                    if email_text.strip():
-                                        email_pbar.set_postfix_str("Generating embedding...")
-                                        email.embedding = self.llm.generate_embedding(email_text)
-                                    else:
-                                        email.embedding = []
-                                    
-                                    doc = email.to_dict()
-                                    email_id = self.storage.insert_one(config.EMAILS_COLLECTION, doc)
-                                    email.id = email_id
-                                    total_emails += 1
-                                    
-                                    email_pbar.update(1)
-                                    
-                                except Exception as e:
-                                    self.logger.error(f"Error processing email: {str(e)}")
-                                    email_pbar.update(1)
-                                    
+                    # Hash what is about to be parsed, so later edits still show up as changes
+                    file_stats[file]['sha256'] = self._file_hash(file)
+                    try:
+                        emails = self.parser.parse_email_file(filepath)
+                    except PartialParseError as e:
+                        self.logger.error(f"Error parsing file {file}: {str(e)}")
+                        incomplete_files.add(file)
+                        # An incremental run keeps the file's previous emails rather than replacing them with
+                        # part of it; a full run has nothing to keep, so it stores what did parse
+                        emails = None if incremental else e.emails
+                    for email in emails or []:
+                        email.source_file = file
                 except Exception as e:
                     self.logger.error(f"Error parsing file {file}: {str(e)}")
-                    
-                file_pbar.update(1)
-                
-        print(f"\n=== Ingestion Complete ===")
-        print(f"Total emails ingested: {total_emails}")
-        print(f"Files processed: {len(email_files)}")
-        
-        return total_emails
\ No newline at end of file
+                    emails = None  # Leaves the file out of the manifest so the next run retries it
+                parsed.put((file, emails))
+        finally:
+            parsed.put(_DONE)
+
+    def _embedding_stage(self, parsed: Queue, embedded: Queue, producer_count: int):
+        """Collect parsed files into multi-email batches and embed each batch with one batched call"""
+        finished_producers = 0
+        batch = []
+        batch_emails = 0
+        in_flight = threading.Semaphore(self.concurrency)
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                while finished_producers < producer_count:
+                    try:
+                        # Only block when there is nothing to send; otherwise ship what we have
+                        item = parsed.get(block=not batch)
+                    except Empty:
+                        self._submit_embedding_batch(pool, in_flight, batch, embedded)
+                        batch, batch_emails = [], 0
+                        continue
+
+                    if item is _DONE:
+                        finished_producers += 1
+                        continue
+
+                    batch.append(item)
+                    batch_emails += len(item[1] or [])
+                    if batch_emails >= config.INGESTION_EMBEDDING_BATCH_SIZE:
+                        self._submit_embedding_batch(pool, in_flight, batch, embedded)
+                        batch, batch_emails = [], 0
+
+                if batch:
+                    self._submit_embedding_batch(pool, in_flight, batch, embedded)
+        finally:
+            embedded.put(_DONE)
+
+    def _submit_embedding_batch(self, pool: ThreadPoolExecutor, in_flight: threading.Semaphore,
+                                batch: List[Tuple[str, List[Email]]], embedded: Queue):
+        in_flight.acquire()
+        future = pool.submit(self._embed_files, batch, embedded)
+        future.add_done_callback(lambda _: in_flight.release())
+
+    def _embed_files(self, batch: List[Tuple[str, List[Email]]], embedded: Queue):
+        emails = [email for _, file_emails in batch for email in file_emails or []]
+        texts = [f"{email.subject} {email.body}" for email in emails]
+        try:
+            embeddings = self._generate_embeddings(texts)
+        except Exception as e:
+            self.logger.error(f"Error generating embeddings for {len(emails)} emails: {str(e)}")
+            embeddings = [[] for _ in emails]
+
+        for email, embedding in zip(emails, embeddings):
+            email.embedding = embedding
+        for item in batch:
+            embedded.put(item)
+
+    def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Reuse cached vectors for unchanged texts and only send the rest to the API"""
+        if not self.embedding_cache:
+            return self.llm.generate_embeddings(texts)
+
+        cached = self.embedding_cache.get_many(texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        generated = self.llm.generate_embeddings([texts[i] for i in missing]) if missing else []
+        self.embedding_cache.set_many([texts[i] for i in missing], generated)
+
+        embeddings = [vector.tolist() if vector is not None else [] for vector in cached]
+        for i, vector in zip(missing, generated):
+            embeddings[i] = vector
+        return embeddings
+
+    def _write_stage(self, embedded: Queue, file_pbar: tqdm, file_stats: Dict[str, Dict[str, Any]],
+                     incomplete_files: Set[str], incremental: bool) -> int:
+        buffer: List[Email] = []
+        buffered_files: Dict[str, int] = {}
+        total_emails = 0
+
+        while True:
+            item = embedded.get()
+            if item is _DONE:
+                break
+
+            file, emails = item
+            if emails is not None:
+                buffer.extend(emails)
+                buffered_files[file] = len(emails)
+                if len(buffer) >= config.INGESTION_WRITE_BATCH_SIZE:
+                    total_emails += self._flush(buffer, buffered_files, file_stats, incomplete_files, incremental)
+                    buffer, buffered_files = [], {}
+
+            file_pbar.set_postfix_str(f"Current: {file} ({len(emails or [])} emails)")
+            file_pbar.update(1)
+
+        if buffered_files:
+            total_emails += self._flush(buffer, buffered_files, file_stats, incomplete_files, incremental)
+
+        return total_emails
+
+    def _flush(self, emails: List[Email], files: Dict[str, int], file_stats: Dict[str, Dict[str, Any]],
+               incomplete_files: Set[str], incremental: bool) -> int:
+        try:
+            docs = [email.to_dict() for email in emails]
+            if incremental and self.vector_store:
+                email_ids = self.vector_store.insert_vectors(config.EMAILS_COLLECTION, docs)
+            else:
+                email_ids = self.storage.insert_many(config.EMAILS_COLLECTION, docs) if docs else []
+        except Exception as e:
+            self.logger.error(f"Error writing {len(emails)} emails: {str(e)}")
+            return 0
+
+        for email, email_id in zip(emails, email_ids):
+            email.id = email_id
+
+        recorded = {file: count for file, count in files.items() if file not in incomplete_files}
+        if incremental:
+            # Emails from a re-parsed file replace everything that file produced before, once they are stored
+            try:
+                self._remove_file_emails(list(files), keep_ids=email_ids)
+            except Exception as e:
+                # Old and new emails now both exist; leaving the files out of the manifest retries the replacement
+                self.logger.error(f"Error removing previous emails of {len(files)} files: {str(e)}")
+                recorded = {}
+
+        # The emails are stored either way; a missing manifest entry only means the file is re-parsed next run
+        try:
+            self._record_manifest(recorded, file_stats)
+        except Exception as e:
+            self.logger.error(f"Error recording {len(files)} files in the manifest: {str(e)}")
+        return len(email_ids)
+
+    def _record_manifest(self, files: Dict[str, int], file_stats: Dict[str, Dict[str, Any]]):
+        with self.storage.bulk_writer(config.MANIFEST_COLLECTION) as manifest_writer:
+            for file, email_count in files.items():
+                entry = dict(file_stats[file], path=file, email_count=email_count,
+                             ingested_at=datetime.now().isoformat())
+                manifest_writer.update({'path': file}, entry, upsert=True)
@@ -3,49 +3,96 @@ from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from core.models.email import Email
 from core.interfaces.llm import LLMInterface
+from core.processors.answer_matcher import AnswerMatcher
 import json
+import numpy as np
+
+class AnswerIndex:
+    """Time-ordered answers of one thread with every question resolved against them.
+
+    All (question, answer) pairs are decided in one pass when the index is built, so the response
+    chain and the daily status analysis read the same decisions instead of asking again.
+    """
+    
+    def __init__(self, emails: List[Email], answer_matcher: AnswerMatcher):
+        self.emails = sorted([e for e in emails if e.date], key=lambda x: x.date)
+        self._questions: Dict[int, List[Tuple[int, Dict[str, Any]]]] = {}  # id(email) -> (question index, question)
+        self._answers: List[Tuple[Email, Dict[str, Any]]] = []
+        self._first_answers: Dict[Tuple[int, Optional[datetime]], Optional[Tuple[Email, Dict[str, Any]]]] = {}
+        
+        question_texts, question_emails, answer_emails = [], [], []
+        for position, email in enumerate(self.emails):
+            questions = self._questions.setdefault(id(email), [])
+            for q in email.metadata.get('questions_asked', []):
+                if q.get('needs_answer'):
+                    questions.append((len(question_texts), q))
+                    question_texts.append(q['question'])
+                    question_emails.append(position)
+            for answer in email.metadata.get('answers_provided', []):
+                self._answers.append((email, answer))
+                answer_emails.append(position)
+        
+        # Only answers sent with or after a question can answer it
+        self._matches = answer_matcher.match_matrix(
+            question_texts, [answer.get('answers_question', '') for _, answer in self._answers],
+            mask=np.array(question_emails)[:, None] <= np.array(answer_emails)[None, :]
+        )
+        
+    def questions_of(self, email: Email) -> List[Tuple[int, Dict[str, Any]]]:
+        """(question index, question) for each question of this email that needs an answer"""
+        return self._questions.get(id(email), [])
+        
+    def first_answer(self, question: int, after: Optional[datetime] = None) -> Optional[Tuple[Email, Dict[str, Any]]]:
+        """Earliest (email, answer) answering the question, optionally only among emails sent after a time"""
+        key = (question, after)
+        if key not in self._first_answers:
+            self._first_answers[key] = next(
+                (self._answers[j] for j in np.flatnonzero(self._matches[question])
+                 if after is None or self._answers[j][0].date > after),
+                None
+            )
+        return self._first_answers[key]
 
 class ResponseTracker:
-    def __init__(self, llm: LLMInterface):
+    def __init__(self, llm: LLMInterface, answer_matcher: Optional[AnswerMatcher] = None):
         self.llm = llm
+        self.answer_matcher = answer_matcher or AnswerMatcher(llm)
         
-    def analyze_response_chains(self, emails: List[Email]) -> Dict[str, Any]:
+    def build_answer_index(self, emails: List[Email]) -> AnswerIndex:
+        return AnswerIndex(emails, self.answer_matcher)
+        
+    def analyze_response_chains(self, emails: List[Email], answer_index: Optional[AnswerIndex] = None) -> Dict[str, Any]:
         """Analyze email chains to track questions and responses"""
         
-        # Sort emails by date
-        sorted_emails = sorted([e for e in emails if e.date], key=lambda x: x.date)
+        answer_index = answer_index or self.build_answer_index(emails)
         
         # Track all questions and their responses
         questions_tracker = []
         
-        for email in sorted_emails:
-            # Get questions from this email
-            questions = email.metadata.get('questions_asked', [])
-            for q in questions:
-                if q.get('needs_answer'):
-                    questions_tracker.append({
-                        'question': q['question'],
-                        'asked_by': email.from_email,
-                        'asked_date': email.date,
-                        'asked_in_subject': email.subject,
-                        'answered': False,
-                        'answer': None,
-                        'answered_by': None,
-                        'answered_date': None,
-                        'response_time_days': None
-                    })
-            
-            # Check if this email answers any previous questions
-            answers = email.metadata.get('answers_provided', [])
-            for answer in answers:
-                # Find matching question
-                for qt in questions_tracker:
-                    if not qt['answered'] and self._matches_question(qt['question'], answer.get('answers_question', '')):
-                        qt['answered'] = True
-                        qt['answer'] = answer['answer']
-                        qt['answered_by'] = email.from_email
-                        qt['answered_date'] = email.date
-                        qt['response_time_days'] = (email.date - qt['asked_date']).days
+        for email in answer_index.emails:
+            for question, q in answer_index.questions_of(email):
+                tracked = {
+                    'question': q['question'],
+                    'asked_by': email.from_email,
+                    'asked_date': email.date,
+                    'asked_in_subject': email.subject,
+                    'answered': False,
+                    'answer': None,
+                    'answered_by': None,
+                    'answered_date': None,
+                    'response_time_days': None
+                }
+                
+                # The first later answer that matches (answers in the asking email count too)
+                first = answer_index.first_answer(question)
+                if first:
+                    answer_email, answer = first
+                    tracked['answered'] = True
+                    tracked['answer'] = answer['answer']
+                    tracked['answered_by'] = answer_email.from_email
+                    tracked['answered_date'] = answer_email.date
+                    tracked['response_time_days'] = (answer_email.date - email.date).days
+                questions_tracker.append(tracked)
         
         # Find unanswered questions
         unanswered = [q for q in questions_tracker if not q['answered']]
@@ -64,23 +111,6 @@ class ResponseTracker:
             'longest_unanswered_days': max([(datetime.now() - q['asked_date']).days for q in unanswered]) if unanswered else 0
         }
     
-    def _matches_question(self, question1: str, question2: str) -> bool:
-        """Use LLM to determine if two questions are the same"""
-        if not question1 or not question2:
-            return False
-            
-        prompt = f"""Do these two questions refer to the same thing? Answer with just 'YES' or 'NO'.
-
-Question 1: {question1}
-Question 2: {question2}"""
-        
-        try:
-            response = self.llm.generate(prompt, temperature=0.1)
-            return 'YES' in response.upper()
-        except:
-            # Fallback to simple comparison
-            return question1.lower() in question2.lower() or question2.lower() in question1.lower()
-    
     def find_conversation_flows(self, emails: List[Email]) -> List[Dict[str, Any]]:
         """Trace conversation flows and identify who's waiting for responses"""
         
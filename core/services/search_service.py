@@ -1,57 +1,106 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from core.interfaces.storage import StorageInterface
 from core.interfaces.llm import LLMInterface
 from core.interfaces.vector_store import VectorStoreInterface
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from core.utils.embedding_cache import QueryEmbeddingCache
+from core.utils.subjects import normalize_subject
 import config
 from datetime import datetime, date
 
+# Thread fields the dashboards read; leaves out email ids, continuations and other bulky analysis data
+THREAD_SUMMARY_PROJECTION = {
+    'subject': 1,
+    'status': 1,
+    'start_date': 1,
+    'last_activity': 1,
+    'participants': 1,
+    'external_participants': 1,
+    'priority_score': 1,
+    'metadata.unanswered_today': 1,
+    'metadata.daily_response_status': 1
+}
+
 class SearchService:
-    def __init__(self, storage: StorageInterface, llm: LLMInterface, vector_store: VectorStoreInterface):
+    def __init__(self, storage: StorageInterface, llm: LLMInterface, vector_store: VectorStoreInterface,
+                 query_cache: Optional[QueryEmbeddingCache] = None):
         self.storage = storage
         self.llm = llm
         self.vector_store = vector_store
+        self.query_cache = query_cache
         
     def search_emails(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
-        query_embedding = self.llm.generate_embedding(query)
+        return self.search_emails_batch([query], limit)[0]
+        
+    def search_emails_batch(self, queries: List[str], limit: int = 10) -> List[List[Dict[str, Any]]]:
+        """Run several searches with one embedding request and one similarity pass"""
+        query_embeddings = self._embed_queries(queries)
         
-        results = self.vector_store.search_similar(
+        results = self.vector_store.search_similar_batch(
             config.EMAILS_COLLECTION,
-            query_embedding,
+            query_embeddings,
             k=limit
         )
         
-        emails = []
-        for doc, score in results:
-            email = self._convert_doc_to_json(doc)
-            email['similarity_score'] = score
-            emails.append(email)
+        all_emails = []
+        for query_results in results:
+            emails = []
+            for doc, score in query_results:
+                email = self._convert_doc_to_json(doc)
+                email['similarity_score'] = score
+                emails.append(email)
+            all_emails.append(emails)
+            
+        return all_emails
+        
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Serve repeated queries from the query cache; only unseen ones go to the embedding API"""
+        if not self.query_cache:
+            return self.llm.generate_embeddings(queries)
             
-        return emails
+        cached = self.query_cache.get_many(queries)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        generated = self.llm.generate_embeddings([queries[i] for i in missing]) if missing else []
+        self.query_cache.set_many([queries[i] for i in missing], generated)
+        
+        embeddings = [vector.tolist() if vector is not None else [] for vector in cached]
+        for i, vector in zip(missing, generated):
+            embeddings[i] = vector
+        return embeddings
         
     def get_high_priorities(self, limit: int = 20) -> List[Dict[str, Any]]:
-        priorities = self.storage.find(config.PRIORITIES_COLLECTION, {})
-        priorities.sort(key=lambda x: x.get('score', 0), reverse=True)
+        # Sorted and limited by Mongo over the score index, so cost does not grow with the collection
+        priorities = list(self.storage.db[config.PRIORITIES_COLLECTION]
+                          .find({}).sort('score', DESCENDING).limit(limit))
+        
+        # One batched fetch for all threads instead of one find_one per priority
+        thread_ids = [ObjectId(p['thread_id']) if isinstance(p['thread_id'], str) else p['thread_id']
+                      for p in priorities if p.get('thread_id')]
+        threads = {str(thread['_id']): thread for thread in self.storage.db[config.THREADS_COLLECTION]
+                   .find({'_id': {'$in': thread_ids}}, THREAD_SUMMARY_PROJECTION)} if thread_ids else {}
         
         enriched_priorities = []
-        for priority in priorities[:limit]:
+        for priority in priorities:
             priority_json = self._convert_doc_to_json(priority)
-            
-            # Get thread info
-            thread_id = priority.get('thread_id')
-            if thread_id:
-                if isinstance(thread_id, str):
-                    thread = self.storage.find_one(config.THREADS_COLLECTION, {'_id': ObjectId(thread_id)})
-                else:
-                    thread = self.storage.find_one(config.THREADS_COLLECTION, {'_id': thread_id})
-                    
-                if thread:
-                    priority_json['thread'] = self._convert_doc_to_json(thread)
-                    
+            thread = threads.get(str(priority.get('thread_id')))
+            if thread:
+                priority_json['thread'] = self._convert_doc_to_json(thread)
             enriched_priorities.append(priority_json)
             
         return enriched_priorities
         
+    def get_dataset_version(self) -> Optional[Dict[str, Any]]:
+        """Version stamp of the last analysis run: {'version': str, 'updated_at': datetime} or None"""
+        return self.storage.db[config.DATASET_METADATA_COLLECTION].find_one({'_id': 'dataset'})
+        
+    def ensure_indexes(self):
+        self.storage.db[config.PRIORITIES_COLLECTION].create_index([('score', DESCENDING)])
+        pending = self.storage.db[config.PENDING_QUESTIONS_COLLECTION]
+        pending.create_index([('day', ASCENDING), ('critical', ASCENDING)])
+        pending.create_index([('days_waiting', DESCENDING)])
+        self.storage.db[config.THREADS_COLLECTION].create_index('participants')
+        
     def _convert_doc_to_json(self, doc: Dict[str, Any]) -> Dict[str, Any]:
         """Convert MongoDB document to JSON-serializable format"""
         if not doc:
@@ -75,59 +124,41 @@ class SearchService:
     def get_todays_unanswered_questions(self) -> List[Dict[str, Any]]:
         """Get questions from today that haven't received responses yet"""
         
-        today = date.today()
-        today_key = today.isoformat()
-        
-        # Get all threads
-        threads = self.storage.find(config.THREADS_COLLECTION, {})
+        today_key = date.today().isoformat()
         
-        todays_unanswered = []
+        # Both branches are served by indexes: (day, critical) and days_waiting
+        rows = self.storage.db[config.PENDING_QUESTIONS_COLLECTION].find(
+            {'$or': [{'day': today_key}, {'critical': True, 'days_waiting': {'$gt': config.CRITICAL_DAYS_WITHOUT_RESPONSE}}]},
+            {'_id': 0}
+        )
         
-        for thread in threads:
-            daily_status = thread.get('metadata', {}).get('daily_response_status', {})
-            
-            # Check if there's activity today
-            if today_key in daily_status:
-                today_data = daily_status[today_key]
-                
-                # Get questions that were asked today and not answered today
-                unanswered_questions = []
-                for q in today_data.get('questions_asked', []):
-                    if not q.get('answered_same_day', False):
-                        unanswered_questions.append({
-                            'question': q['question'],
-                            'asked_by': q['asked_by'],
-                            'asked_at': q.get('asked_at', ''),
-                            'email_subject': q.get('email_subject', '')
-                        })
-                
-                if unanswered_questions:
-                    todays_unanswered.append({
-                        'thread_id': str(thread['_id']),
-                        'thread_subject': thread.get('subject'),
-                        'questions': unanswered_questions,
-                        'total_unanswered_today': len(unanswered_questions)
-                    })
-            
-            # Also check unanswered_today from enhanced analysis
-            unanswered_today = thread.get('metadata', {}).get('unanswered_today', [])
-            critical_unanswered = [u for u in unanswered_today if u.get('critical', False)]
+        todays_unanswered = {}
+        for row in rows:
+            thread_entry = todays_unanswered.setdefault(row['thread_id'], {
+                'thread_id': row['thread_id'],
+                'thread_subject': row.get('thread_subject')
+            })
             
-            if critical_unanswered:
-                # Add or update the thread entry
-                thread_entry = next((t for t in todays_unanswered if t['thread_id'] == str(thread['_id'])), None)
-                if not thread_entry:
-                    todays_unanswered.append({
-                        'thread_id': str(thread['_id']),
-                        'thread_subject': thread.get('subject'),
-                        'critical_unanswered': critical_unanswered,
-                        'oldest_unanswered_days': max([u['days_waiting'] for u in critical_unanswered])
-                    })
-                else:
-                    thread_entry['critical_unanswered'] = critical_unanswered
-                    thread_entry['oldest_unanswered_days'] = max([u['days_waiting'] for u in critical_unanswered])
+            if row['day'] == today_key:
+                thread_entry.setdefault('questions', []).append({
+                    'question': row['question'],
+                    'asked_by': row['asker'],
+                    'asked_at': row.get('asked_at', ''),
+                    'email_subject': row.get('email_subject', '')
+                })
+                thread_entry['total_unanswered_today'] = len(thread_entry['questions'])
+            else:
+                thread_entry.setdefault('critical_unanswered', []).append({
+                    'question': row['question'],
+                    'asked_by': row['asker'],
+                    'asked_on': row['day'],
+                    'days_waiting': row['days_waiting'],
+                    'critical': True
+                })
+                thread_entry['oldest_unanswered_days'] = max(thread_entry.get('oldest_unanswered_days', 0), row['days_waiting'])
         
         # Sort by urgency
+        todays_unanswered = list(todays_unanswered.values())
         todays_unanswered.sort(key=lambda x: x.get('oldest_unanswered_days', 0), reverse=True)
         
         return todays_unanswered
@@ -176,39 +207,39 @@ class SearchService:
     def get_cross_thread_connections(self, thread_id: str) -> List[Dict[str, Any]]:
         """Find other threads that might be connected to this one"""
         
-        thread = self.storage.find_one(config.THREADS_COLLECTION, {'_id': ObjectId(thread_id)})
+        thread = self.storage.db[config.THREADS_COLLECTION].find_one(
+            {'_id': ObjectId(thread_id)}, {'subject': 1, 'participants': 1})
         if not thread:
             return []
         
-        # Get thread participants and key terms
-        participants = set(thread.get('participants', []))
-        
-        # Find other threads with overlapping participants
-        all_threads = self.storage.find(config.THREADS_COLLECTION, {})
+        participants = list(set(thread.get('participants', [])))
+        subject_key = normalize_subject(thread.get('subject', ''))
+        
+        # The multikey participants index finds the neighbourhood; overlap and continuation are computed in Mongo
+        pipeline = [
+            {'$match': {'participants': {'$in': participants}, '_id': {'$ne': thread['_id']}}},
+            {'$project': {
+                'subject': 1,
+                'last_activity': 1,
+                'status': 1,
+                'common_participants': {'$filter': {'input': '$participants', 'cond': {'$in': ['$$this', participants]}}},
+                'is_continuation': {'$in': [subject_key, {'$ifNull': ['$metadata.continuation_keys', []]}]}
+            }},
+            {'$addFields': {'common_count': {'$size': '$common_participants'}}},
+            {'$match': {'common_count': {'$gte': 2}}},  # At least 2 common participants
+            {'$sort': {'is_continuation': -1, 'common_count': -1}},
+            {'$limit': 5}
+        ]
         
         connections = []
-        for other_thread in all_threads:
-            if str(other_thread['_id']) == thread_id:
-                continue
-                
-            other_participants = set(other_thread.get('participants', []))
-            common_participants = participants & other_participants
-            
-            if len(common_participants) >= 2:  # At least 2 common participants
-                # Check for continuations
-                continuations = other_thread.get('metadata', {}).get('thread_continuations', [])
-                is_continuation = any(cont.get('original_subject') in thread.get('subject', '') for cont in continuations)
-                
-                connections.append({
-                    'thread_id': str(other_thread['_id']),
-                    'subject': other_thread.get('subject'),
-                    'common_participants': list(common_participants),
-                    'is_continuation': is_continuation,
-                    'last_activity': other_thread.get('last_activity'),
-                    'status': other_thread.get('status')
-                })
-        
-        # Sort by relevance
-        connections.sort(key=lambda x: (x['is_continuation'], len(x['common_participants'])), reverse=True)
-        
-        return connections[:5]  # Return top 5 connections
\ No newline at end of file
+        for other_thread in self.storage.db[config.THREADS_COLLECTION].aggregate(pipeline):
+            connections.append({
+                'thread_id': str(other_thread['_id']),
+                'subject': other_thread.get('subject'),
+                'common_participants': other_thread['common_participants'],
+                'is_continuation': other_thread['is_continuation'],
+                'last_activity': other_thread.get('last_activity'),
+                'status': other_thread.get('status')
+            })
+        
+        return connections
@@ -0,0 +1,48 @@
+from typing import Dict, List, Any, Optional
+import threading
+import config
+
+class BulkWriter:
+    """Buffers writes to one collection and sends them to storage as unordered bulk_write batches"""
+
+    def __init__(self, storage, collection: str, flush_size: Optional[int] = None):
+        self.storage = storage
+        self.collection = collection
+        self.flush_size = flush_size or config.STORAGE_BULK_FLUSH_SIZE
+        self.written = 0
+        self._operations: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def insert(self, document: Dict[str, Any]):
+        self._add({'op': 'insert', 'document': document})
+
+    def upsert(self, query: Dict[str, Any], document: Dict[str, Any]):
+        """Replace the document matching query, inserting it when there is none"""
+        self._add({'op': 'replace', 'filter': query, 'document': document, 'upsert': True})
+
+    def update(self, query: Dict[str, Any], update: Dict[str, Any], many: bool = False, upsert: bool = False):
+        """$set the given fields on the matching document(s)"""
+        self._add({'op': 'update', 'filter': query, 'update': update, 'many': many, 'upsert': upsert})
+
+    def flush(self):
+        with self._lock:
+            operations, self._operations = self._operations, []
+        if operations:
+            self.storage.bulk_write(self.collection, operations)
+            self.written += len(operations)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self) -> "BulkWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _add(self, operation: Dict[str, Any]):
+        with self._lock:
+            self._operations.append(operation)
+            full = len(self._operations) >= self.flush_size
+        if full:
+            self.flush()
@@ -0,0 +1,146 @@
+from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+
+class EmbeddingCache:
+    """Persistent text -> embedding store with vectors kept as float32 blobs in SQLite"""
+
+    def __init__(self, path: Path, model: str, max_entries: Optional[int] = None):
+        self.path = path
+        self.model = model
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._db.commit()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        keys = [self._key(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+
+            vectors = [found.get(key) for key in keys]
+            hits = sum(1 for vector in vectors if vector is not None)
+            self.hits += hits
+            self.misses += len(vectors) - hits
+        return vectors
+
+    def set_many(self, texts: List[str], vectors: List[List[float]]):
+        rows = [
+            (self._key(text), np.asarray(vector, dtype=np.float32).tobytes())
+            for text, vector in zip(texts, vectors) if vector is not None and len(vector)
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            if self.max_entries is not None:
+                # Replaced rows get a fresh rowid, so this drops the least recently written vectors
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE rowid IN ("
+                    "SELECT rowid FROM embeddings ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self._db.commit()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode('utf-8')).hexdigest()
+
+
+
+class QueryEmbeddingCache:
+    """LRU of normalized search query -> float32 vector, optionally backed by a persistent EmbeddingCache"""
+
+    def __init__(self, memory_entries: int = 1024, store: Optional[EmbeddingCache] = None):
+        self.memory_entries = memory_entries
+        self.store = store
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return ' '.join((query or '').split()).lower()
+
+    def get_many(self, queries: List[str]) -> List[Optional[np.ndarray]]:
+        keys = [self.normalize(query) for query in queries]
+        vectors: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    vectors[i] = self._memory[key]
+                    self.memory_hits += 1
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing and self.store is not None:
+            for i, vector in zip(missing, self.store.get_many([keys[i] for i in missing])):
+                if vector is not None:
+                    vectors[i] = vector
+                    self._remember(keys[i], vector)
+                    with self._lock:
+                        self.disk_hits += 1
+
+        with self._lock:
+            self.misses += sum(1 for vector in vectors if vector is None)
+        return vectors
+
+    def set_many(self, queries: List[str], vectors: List[List[float]]):
+        keys, arrays = [], []
+        for query, vector in zip(queries, vectors):
+            if vector is not None and len(vector):
+                keys.append(self.normalize(query))
+                arrays.append(np.asarray(vector, dtype=np.float32))
+        for key, array in zip(keys, arrays):
+            self._remember(key, array)
+        if self.store is not None and keys:
+            self.store.set_many(keys, arrays)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._memory),
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+            }
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
@@ -0,0 +1,21 @@
+from typing import Optional
+import threading
+import time
+
+class RateLimiter:
+    """Spaces calls evenly so that at most requests_per_minute start in any minute; safe across threads"""
+
+    def __init__(self, requests_per_minute: Optional[float]):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
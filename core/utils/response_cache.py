@@ -0,0 +1,115 @@
+from typing import Any, Dict, Optional
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+def make_cache_key(*parts: Any) -> str:
+    """Content-address a request: identical inputs always map to the same key"""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """In-memory LRU in front of an optional SQLite file, with TTL and size-bounded eviction"""
+
+    def __init__(self, path: Optional[Path] = None, memory_entries: int = 1024,
+                 max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1], now):
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._expired(row[1], now):
+                    self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now, now)
+                )
+                self._db.commit()
+                self._writes_since_trim += 1
+                if self._writes_since_trim >= 100:
+                    self._trim(now)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._trim(time.time())
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key: str, value: Any, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _trim(self, now: float):
+        self._writes_since_trim = 0
+        if self.ttl_seconds is not None:
+            self._db.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl_seconds,))
+        if self.max_entries is not None:
+            self._db.execute(
+                "DELETE FROM entries WHERE key IN ("
+                "SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+        self._db.commit()
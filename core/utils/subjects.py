@@ -0,0 +1,24 @@
+from typing import List
+import re
+
+# Reply/forward markers, including localized ones (VS: Hungarian, AW: German, SV: Nordic)
+_REPLY_PREFIX = re.compile(r'^\s*((re|fw|fwd|vs|aw|sv|tr|antw|wg)\s*(\[\d+\])?\s*:\s*)+', re.IGNORECASE)
+
+def strip_reply_prefix(subject: str) -> str:
+    """The subject without its Re:/Fwd:-style prefixes, otherwise unchanged"""
+    return _REPLY_PREFIX.sub('', subject or '')
+
+def normalize_subject(subject: str) -> str:
+    """Strip Re:/Fwd:-style prefixes and normalize case and whitespace"""
+    if not subject:
+        return ''
+    return ' '.join(strip_reply_prefix(subject).split()).lower()
+
+def has_reply_prefix(subject: str) -> bool:
+    return bool(subject) and _REPLY_PREFIX.match(subject) is not None
+
+def subject_keys(subject: str, reply_to_subject: str = None) -> List[str]:
+    """Normalized subjects an email can be threaded under: its own and the one it replies to"""
+    keys = {normalize_subject(subject), normalize_subject(reply_to_subject or '')}
+    keys.discard('')
+    return sorted(keys)
@@ -0,0 +1,9 @@
+import math
+
+CHARS_PER_TOKEN = 4  # Rough average for English text with OpenAI tokenizers
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for request packing and usage accounting"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
@@ -0,0 +1,24 @@
+from typing import Optional
+import numpy as np
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Return a contiguous float32 matrix with unit-length rows; zero rows stay zero"""
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms)
+
+def cosine_similarity_matrix(a, b: Optional[np.ndarray] = None) -> np.ndarray:
+    """Pairwise cosine similarities between the rows of a and b (or a with itself) in one matmul"""
+    a = normalize_rows(a)
+    b = a if b is None else normalize_rows(b)
+    return a @ b.T
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores along the last axis, best first"""
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+    top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1)
+    return np.take_along_axis(top, order, axis=-1)
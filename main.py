@@ -4,15 +4,47 @@ from core.implementations.mongo_storage import MongoStorage
 from core.implementations.mongo_vector import MongoVectorStore
 from core.implementations.openai_llm import OpenAILLM
 from core.implementations.anthropic_validator import AnthropicValidator
+from core.implementations.cached_llm import CachedLLM
+from core.implementations.cached_validator import CachedValidator
+from core.utils.response_cache import ResponseCache
+from core.utils.embedding_cache import EmbeddingCache, QueryEmbeddingCache
 from core.services.ingestion_service import IngestionService
 from core.services.analysis_service import AnalysisService
+from core.services.search_service import SearchService
+from typing import Optional
+import atexit
 import sys
 import os
+import config
 
-def create_app():
+def create_app(storage: Optional[MongoStorage] = None):
     app = Flask(__name__, 
                 template_folder='web/templates',
                 static_folder='static')
+    
+    # One pooled Mongo client and one set of API clients for the lifetime of the app
+    if storage is None:
+        storage = MongoStorage()
+        storage.connect()
+    llm = OpenAILLM()
+    vector_store = MongoVectorStore(storage)
+    query_cache = None
+    if config.QUERY_CACHE_ENABLED:
+        store = (EmbeddingCache(config.QUERY_CACHE_PATH, config.EMBEDDING_MODEL, config.QUERY_CACHE_MAX_ENTRIES)
+                 if config.QUERY_CACHE_PATH else None)
+        query_cache = QueryEmbeddingCache(config.QUERY_CACHE_MEMORY_ENTRIES, store)
+        atexit.register(query_cache.close)
+    search_service = SearchService(storage, llm, vector_store, query_cache)
+    search_service.ensure_indexes()
+    app.extensions['services'] = {
+        'storage': storage,
+        'llm': llm,
+        'vector_store': vector_store,
+        'search_service': search_service,
+        'response_cache': ResponseCache(memory_entries=config.API_CACHE_ENTRIES)
+    }
+    atexit.register(storage.disconnect)
+    
     app.register_blueprint(bp)
     return app
 
@@ -24,19 +56,37 @@ def initialize_system():
     vector_store = MongoVectorStore(storage)
     validator = AnthropicValidator()
     
+    cache = None
+    if config.LLM_CACHE_ENABLED:
+        cache = ResponseCache(
+            config.LLM_CACHE_PATH,
+            memory_entries=config.LLM_CACHE_MEMORY_ENTRIES,
+            max_entries=config.LLM_CACHE_MAX_ENTRIES,
+            ttl_seconds=config.LLM_CACHE_TTL_SECONDS
+        )
+        llm = CachedLLM(llm, cache)
+        validator = CachedValidator(validator, cache)
+    
     if '--ingest' in sys.argv:
         print("Starting email ingestion...")
-        ingestion_service = IngestionService(storage, llm)
-        count = ingestion_service.ingest_all_emails()
+        ingestion_service = IngestionService(storage, llm, vector_store)
+        count = ingestion_service.ingest_all_emails(incremental='--incremental' in sys.argv)
         print(f"Ingestion complete. Processed {count} emails.")
+        if cache:
+            cache.close()
         storage.disconnect()
         sys.exit(0)
         
     if '--analyze' in sys.argv:
         print("Starting portfolio analysis...")
         analysis_service = AnalysisService(storage, llm, vector_store, validator)
-        analysis_service.analyze_portfolio()
+        analysis_service.analyze_portfolio(incremental='--incremental' in sys.argv)
         print("Analysis complete.")
+        if cache:
+            stats = cache.stats()
+            print(f"LLM cache: {stats['memory_hits'] + stats['disk_hits']} hits, "
+                  f"{stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+            cache.close()
         storage.disconnect()
         sys.exit(0)
     
@@ -45,7 +95,7 @@ def initialize_system():
 if __name__ == '__main__':
     storage = initialize_system()
     
-    app = create_app()
+    app = create_app(storage)
     
     try:
         app.run(debug=True, host='0.0.0.0', port=5000)
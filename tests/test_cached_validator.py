@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import config
+from core.implementations.cached_validator import CachedValidator
+from core.models.priority import Priority
+from core.processors.priority_calculator import PriorityCalculator
+from core.utils.response_cache import ResponseCache
+
+
+class CountingValidator:
+    def __init__(self):
+        self.calls = 0
+
+    def validate_batch(self, data_list, validation_prompt, pack_size=None):
+        results = []
+        for _ in data_list:
+            self.calls += 1
+            results.append({'valid': True, 'score': self.calls / 10})
+        return results
+
+
+def make_priority(thread_id):
+    return Priority(id=None, email_id='e1', thread_id=thread_id, score=0.0,
+                    attention_flags={'unresolved_questions': 0.5}, issues=[], recommendations=['Follow up'],
+                    days_stalled=3, last_activity=datetime(2024, 1, 1), participants=[],
+                    external_participants=[], attachments=[], created_at=datetime(2024, 1, 1),
+                    validation_scores=[])
+
+
+def test_each_validation_round_calls_the_validator(monkeypatch):
+    monkeypatch.setattr(config, 'VALIDATION_ROUNDS', 2)
+    validator = CountingValidator()
+    calculator = PriorityCalculator(None, CachedValidator(validator, ResponseCache()))
+
+    first = make_priority('thread-1')
+    calculator.validate_priorities([first])
+    assert validator.calls == 2
+
+    # A cached re-run still returns one score per round, not the first round's score twice
+    rerun = make_priority('thread-1')
+    calculator.validate_priorities([rerun])
+    assert validator.calls == 2
+    assert rerun.validation_scores == first.validation_scores == [0.1, 0.2]
+
+
+def test_added_round_is_validated_not_copied(monkeypatch):
+    validator = CountingValidator()
+    calculator = PriorityCalculator(None, CachedValidator(validator, ResponseCache()))
+
+    monkeypatch.setattr(config, 'VALIDATION_ROUNDS', 1)
+    calculator.validate_priorities([make_priority('thread-1')])
+    monkeypatch.setattr(config, 'VALIDATION_ROUNDS', 2)
+    calculator.validate_priorities([make_priority('thread-1')])
+
+    assert validator.calls == 2
+
+
+def test_rerun_with_new_thread_ids_is_served_from_cache(monkeypatch):
+    monkeypatch.setattr(config, 'VALIDATION_ROUNDS', 2)
+    validator = CountingValidator()
+    calculator = PriorityCalculator(None, CachedValidator(validator, ResponseCache()))
+
+    calculator.validate_priorities([make_priority('thread-1')])
+    calculator.validate_priorities([make_priority('thread-2')])
+
+    assert validator.calls == 2
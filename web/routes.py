@@ -1,8 +1,7 @@
-from flask import Blueprint, render_template, jsonify, request, send_file
-from core.services.search_service import SearchService
-from core.implementations.mongo_storage import MongoStorage
-from core.implementations.openai_llm import OpenAILLM
-from core.implementations.mongo_vector import MongoVectorStore
+from flask import Blueprint, render_template, jsonify, request, send_file, current_app
+from functools import wraps
+from datetime import datetime, date, time, timezone
+from core.utils.response_cache import make_cache_key
 import os
 import config
 from bson.json_util import dumps
@@ -11,12 +10,54 @@ import json
 bp = Blueprint('main', __name__)
 
 def get_services():
-    storage = MongoStorage()
-    storage.connect()
-    llm = OpenAILLM()
-    vector_store = MongoVectorStore(storage)
-    search_service = SearchService(storage, llm, vector_store)
-    return storage, search_service
+    """Application-scoped services wired once in create_app and shared by all requests"""
+    services = current_app.extensions['services']
+    return services['storage'], services['search_service']
+
+def versioned_response(view=None, *, daily: bool = False):
+    """Cache a read endpoint's JSON per (endpoint, args, dataset version) and answer conditional requests.
+
+    daily=True is for endpoints whose result depends on today's date: the date becomes part of the key,
+    so yesterday's response is neither served nor revalidated after midnight.
+    """
+    if view is None:
+        return lambda view: versioned_response(view, daily=daily)
+        
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        services = current_app.extensions['services']
+        stamp = services['search_service'].get_dataset_version()
+        if not stamp:
+            return view(*args, **kwargs)
+            
+        today = date.today()
+        key_parts = [request.path, sorted(request.args.items(multi=True)), stamp['version']]
+        if daily:
+            key_parts.append(today.isoformat())
+        etag = make_cache_key(*key_parts)
+        last_modified = stamp['updated_at'].replace(tzinfo=timezone.utc)
+        if daily:
+            last_modified = max(last_modified, datetime.combine(today, time()).astimezone(timezone.utc))
+        
+        if etag in request.if_none_match or \
+           (not request.if_none_match and request.if_modified_since and request.if_modified_since >= last_modified):
+            response = current_app.response_class(status=304)
+        else:
+            cache = services['response_cache']
+            body = cache.get(etag)
+            if body is None:
+                result = current_app.make_response(view(*args, **kwargs))
+                if result.status_code != 200:
+                    return result
+                body = result.get_data(as_text=True)
+                cache.set(etag, body)
+            response = current_app.response_class(body, mimetype='application/json')
+            
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True  # Always revalidate; unchanged data costs a 304
+        return response
+    return wrapper
 
 @bp.route('/')
 def index():
@@ -27,8 +68,9 @@ def priorities():
     return render_template('priorities.html')
 
 @bp.route('/api/priorities')
+@versioned_response
 def api_priorities():
-    storage, search_service = get_services()
+    _, search_service = get_services()
     try:
         limit = request.args.get('limit', 20, type=int)
         priorities = search_service.get_high_priorities(limit)
@@ -36,8 +78,6 @@ def api_priorities():
     except Exception as e:
         print(f"Error in api_priorities: {str(e)}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        storage.disconnect()
 
 @bp.route('/search')
 def search():
@@ -45,7 +85,7 @@ def search():
 
 @bp.route('/api/search')
 def api_search():
-    storage, search_service = get_services()
+    _, search_service = get_services()
     try:
         query = request.args.get('q', '')
         limit = request.args.get('limit', 10, type=int)
@@ -57,8 +97,13 @@ def api_search():
     except Exception as e:
         print(f"Error in api_search: {str(e)}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        storage.disconnect()
+
+@bp.route('/api/search/cache-stats')
+def api_search_cache_stats():
+    _, search_service = get_services()
+    if not search_service.query_cache:
+        return jsonify({'enabled': False})
+    return jsonify(dict(search_service.query_cache.stats(), enabled=True))
 
 @bp.route('/download/<path:filepath>')
 def download_attachment(filepath):
@@ -68,31 +113,25 @@ def download_attachment(filepath):
     return "File not found", 404
 
 @bp.route('/api/todays-pending')
+@versioned_response(daily=True)
 def api_todays_pending():
-    storage, search_service = get_services()
-    try:
-        pending = search_service.get_todays_unanswered_questions()
-        return jsonify(pending)
-    finally:
-        storage.disconnect()
+    _, search_service = get_services()
+    pending = search_service.get_todays_unanswered_questions()
+    return jsonify(pending)
 
 @bp.route('/api/thread-timeline/<thread_id>')
+@versioned_response
 def api_thread_timeline(thread_id):
-    storage, search_service = get_services()
-    try:
-        timeline = search_service.get_response_timeline(thread_id)
-        return jsonify(timeline)
-    finally:
-        storage.disconnect()
+    _, search_service = get_services()
+    timeline = search_service.get_response_timeline(thread_id)
+    return jsonify(timeline)
 
 @bp.route('/api/thread-connections/<thread_id>')
+@versioned_response
 def api_thread_connections(thread_id):
-    storage, search_service = get_services()
-    try:
-        connections = search_service.get_cross_thread_connections(thread_id)
-        return jsonify(connections)
-    finally:
-        storage.disconnect()
+    _, search_service = get_services()
+    connections = search_service.get_cross_thread_connections(thread_id)
+    return jsonify(connections)
 
 @bp.route('/thread/<thread_id>')
 def thread_details(thread_id):